@@ -0,0 +1,72 @@
+"""
+Copyright (c) 2016 Alan Yorinks All rights reserved.
+
+This program is free software; you can redistribute it and/or
+modify it under the terms of the GNU  General Public
+License as published by the Free Software Foundation; either
+version 3 of the License, or (at your option) any later version.
+
+This library is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public
+License along with this library; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+
+class RenderScheduler:
+    """
+    This class holds the values to be shown in Tk variables and writes them at a fixed display rate.
+    Only the latest value for each variable is kept, and a variable that already shows its value is not written,
+    so a burst of reports causes at most one redraw of each widget per display interval.
+    Nothing is scheduled while there is nothing to show.
+    """
+
+    def __init__(self, root, interval=33):
+        """
+        :param root: Tk root window
+        :param interval: display interval in milliseconds. 33 = 30 updates a second.
+        """
+        self.root = root
+        self.interval = interval
+
+        # latest (variable, value) for each Tk variable, keyed by variable name - Tk variables are not hashable
+        self.pending = {}
+        self.scheduled = False
+
+        # statistics
+        self.updates = 0
+        self.coalesced = 0
+
+    def set(self, variable, value):
+        """
+        Set the value that a Tk variable will show at the next display update
+        :param variable: Tk variable
+        :param value: value to show
+        :return:
+        """
+        name = str(variable)
+        if name in self.pending:
+            self.coalesced += 1
+        self.pending[name] = (variable, value)
+
+        if not self.scheduled:
+            self.scheduled = True
+            self.root.after(self.interval, self.flush)
+
+    def flush(self):
+        """
+        Write the pending values that differ from what the variables show
+        :return:
+        """
+        pending = self.pending
+        self.pending = {}
+        self.scheduled = False
+
+        for variable, value in pending.values():
+            if variable.get() != value:
+                variable.set(value)
+                self.updates += 1
@@ -0,0 +1,138 @@
+"""
+Copyright (c) 2016 Alan Yorinks All rights reserved.
+
+This program is free software; you can redistribute it and/or
+modify it under the terms of the GNU  General Public
+License as published by the Free Software Foundation; either
+version 3 of the License, or (at your option) any later version.
+
+This library is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public
+License along with this library; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+from tkinter import Canvas
+
+import numpy as np
+
+
+class RingBuffer:
+    """
+    This class keeps the most recent samples of a channel in a fixed size numpy array.
+    Once the buffer is full, each new sample overwrites the oldest one, so memory use never grows.
+    """
+
+    def __init__(self, capacity):
+        """
+        :param capacity: number of samples kept
+        """
+        self.samples = np.zeros(capacity, dtype=np.float64)
+        self.next = 0
+        self.count = 0
+
+    def append(self, value):
+        """
+        Add a sample, replacing the oldest one if the buffer is full
+        :param value: sample value
+        :return:
+        """
+        self.samples[self.next] = value
+        self.next = (self.next + 1) % len(self.samples)
+        if self.count < len(self.samples):
+            self.count += 1
+
+    def values(self):
+        """
+        :return: the samples held, oldest first
+        """
+        if self.count < len(self.samples):
+            return self.samples[:self.count]
+        return np.concatenate((self.samples[self.next:], self.samples[:self.next]))
+
+
+class StripChart:
+    """
+    This class draws the recent history of one or more channels as lines on a Tk canvas.
+    Each channel has one line item that is created once. Redrawing replaces the line's coordinates.
+    The vertical scale follows the range of the samples being shown, unless fixed limits are given.
+    """
+
+    def __init__(self, parent, channels, capacity=1000, width=300, height=120, limits=None):
+        """
+        :param parent: Tk widget the canvas is placed in
+        :param channels: list of (channel name, line color)
+        :param capacity: number of samples kept per channel
+        :param width: canvas width in pixels
+        :param height: canvas height in pixels
+        :param limits: optional (minimum, maximum) of the vertical scale
+        """
+        self.width = width
+        self.height = height
+        self.limits = limits
+
+        self.canvas = Canvas(parent, width=width, height=height, background='white', highlightthickness=0)
+
+        # buffer and line item for each channel, keyed by channel name
+        self.buffers = {}
+        self.lines = {}
+        for name, color in channels:
+            self.buffers[name] = RingBuffer(capacity)
+            self.lines[name] = self.canvas.create_line(0, 0, 0, 0, fill=color, state='hidden')
+
+        # True when samples were added since the last redraw
+        self.changed = False
+
+    def append(self, name, value):
+        """
+        Add a sample to a channel. The chart is not redrawn until redraw is called.
+        :param name: channel name
+        :param value: sample value
+        :return:
+        """
+        self.buffers[name].append(value)
+        self.changed = True
+
+    def redraw(self):
+        """
+        Move the lines to show the current samples. Nothing is done if no samples were added.
+        When there are more samples than pixels, every nth sample is drawn.
+        :return:
+        """
+        if not self.changed:
+            return
+        self.changed = False
+
+        series = {name: buffer.values() for name, buffer in self.buffers.items()}
+        shown = [values for values in series.values() if len(values) > 1]
+        if not shown:
+            return
+
+        if self.limits:
+            low, high = self.limits
+        else:
+            low = min(values.min() for values in shown)
+            high = max(values.max() for values in shown)
+        if high == low:
+            high = low + 1
+
+        for name, values in series.items():
+            if len(values) < 2:
+                continue
+
+            # the line grows from the left until the buffer is full, then scrolls
+            capacity = len(self.buffers[name].samples)
+            step = max(1, capacity // self.width)
+            x = np.arange(0, len(values), step) * ((self.width - 1) / (capacity - 1))
+            values = values[::step]
+            y = (self.height - 2) - (values - low) * ((self.height - 4) / (high - low))
+
+            coordinates = np.empty(len(values) * 2)
+            coordinates[0::2] = x
+            coordinates[1::2] = y
+            self.canvas.coords(self.lines[name], *coordinates.tolist())
+            self.canvas.itemconfigure(self.lines[name], state='normal')
@@ -19,35 +19,75 @@ Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
 """
 
 import argparse
+import functools
+import importlib
+import math
+import os
 import signal
-import time
+import sys
 from tkinter import *
 from tkinter import font
 from tkinter import ttk
 
 import umsgpack
 import zmq
-from xideco.xidekit.xidekit import XideKit
+
+# noinspection PyUnresolvedReferences
+from render_scheduler import RenderScheduler
+# noinspection PyUnresolvedReferences
+from strip_chart import StripChart
+
+try:
+    # noinspection PyUnresolvedReferences
+    from redbot.report_formats import ACCEL_PACKED_STRUCT
+    # noinspection PyUnresolvedReferences
+    from router.local_endpoints import LocalXideKit
+    # noinspection PyUnresolvedReferences
+    from router.xibrt import ipc_endpoints
+except ImportError:
+    # run as a script - the package root is not on the module path
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+    # noinspection PyUnresolvedReferences
+    from redbot.report_formats import ACCEL_PACKED_STRUCT
+    # noinspection PyUnresolvedReferences
+    from router.local_endpoints import LocalXideKit
+    # noinspection PyUnresolvedReferences
+    from router.xibrt import ipc_endpoints
+
+# messages processed before Tk is given a chance to handle its other events
+MESSAGE_BATCH = 500
+
+# milliseconds between updates of the widgets showing robot reports - 30 updates a second
+DISPLAY_INTERVAL = 33
+
+# samples of history kept for each telemetry chart channel
+CHART_HISTORY = 1000
 
 
 # noinspection PyMethodMayBeStatic,PyUnresolvedReferences,PyUnusedLocal
-class Xitk(XideKit):
+class Xitk(LocalXideKit):
     """
     A tkinter robot controller for XideKit based robots
     """
 
     def __init__(self, subscribed=None, router_ip_address=None, subscriber_port='43125',
-                 publisher_port='43124'):
+                 publisher_port='43124', router_endpoints=None, context=None, plugins=None):
         """
         Create the GUI and its widgets and then start up the main loop
         :param subscribed: Topics to subscribe to. Must be in a list
         :param router_ip_address: Xideco Router Ip Address
         :param subscriber_port: Xideco Router subscriber port
         :param publisher_port: Xideco Router publisher port
+        :param router_endpoints: Optional (publish to router, subscribe to router) ipc:// or inproc:// endpoints
+                                 used instead of TCP
+        :param context: zmq context to use. Required for inproc:// endpoints - it must be the router's context.
+        :param plugins: List of module names. Each module's register function is called with this Xitk instance
+                        once the widgets exist, and may add or replace report handlers with register_report_handler.
         """
 
         print('\nXiBot tkinter GUI - xitk')
-        super().__init__(router_ip_address, subscriber_port, publisher_port)
+
+        super().__init__(router_ip_address, subscriber_port, publisher_port, router_endpoints, context)
 
         # subscribe to all topics specified
         if subscribed is None:
@@ -65,6 +105,9 @@ class Xitk(XideKit):
 
         self.root.title("XiBot Controller")
 
+        # reports are shown at the display rate rather than as they arrive
+        self.render = RenderScheduler(self.root, DISPLAY_INTERVAL)
+
         # create tk variables
 
         # left panel variables
@@ -73,6 +116,12 @@ class Xitk(XideKit):
         self.right_motor_encoder = IntVar()
         self.right_motor_encoder.set(0)
 
+        # encoder totals are kept here so that they are exact however often the display is updated
+        self.encoder_totals = [0, 0]
+
+        # robot time of the last encoder report, used to calculate the encoder rates
+        self.encoder_time = None
+
         # push button
         self.push_button = StringVar()
         self.push_button.set('Off')
@@ -179,9 +228,14 @@ class Xitk(XideKit):
         self.create_left_frame()
         self.create_center_frame()
         self.create_right_frame()
+        self.create_chart_frame()
 
         self.spinbox.config(state=DISABLED)
 
+        self.register_builtin_reports()
+        for plugin in plugins or []:
+            importlib.import_module(plugin).register(self)
+
         # bind the key presses
 
         self.root.bind("<KeyPress>", self.keyboard)
@@ -189,6 +243,15 @@ class Xitk(XideKit):
 
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
 
+        # wake up when the subscriber socket has messages instead of polling for them
+        if hasattr(self.root.tk, 'createfilehandler'):
+            self.root.tk.createfilehandler(self.subscriber.getsockopt(zmq.FD), READABLE, self.subscriber_readable)
+            self.polling = False
+        else:
+            # Tk file handlers are not available on Windows
+            self.polling = True
+
+        # messages may have arrived before the file handler was created
         self.root.after(5, self.get_message)
 
         self.root.mainloop()
@@ -528,28 +591,80 @@ class Xitk(XideKit):
         info5 = ttk.Label(right_frame, font=app_highlight_font, text="  4. 'p' to spin right.  ")
         info5.grid(column=0, row=23, pady=(0, 70), padx=30, sticky=(W, E, N))
 
+    def create_chart_frame(self):
+        """
+        Create the telemetry chart panel below the other panels
+        :return:
+        """
+        chart_frame = ttk.Labelframe(self.content, borderwidth=5, relief="raised", text="Telemetry")
+        chart_frame.grid(column=0, row=1, columnspan=3, sticky=(N, S, E, W))
+
+        self.accel_chart = StripChart(chart_frame, [('x', 'red'), ('y', 'green'), ('z', 'blue')], CHART_HISTORY)
+        self.ir_chart = StripChart(chart_frame, [('ir1', 'red'), ('ir2', 'green'), ('ir3', 'blue')], CHART_HISTORY,
+                                   limits=(0, 1023))
+        self.encoder_chart = StripChart(chart_frame, [('left', 'red'), ('right', 'blue')], CHART_HISTORY)
+        self.charts = [self.accel_chart, self.ir_chart, self.encoder_chart]
+        self.charts_scheduled = False
+
+        for column, (title, chart) in enumerate((('Accelerometer Gs - x red, y green, z blue', self.accel_chart),
+                                                 ('Line Followers - 1 red, 2 green, 3 blue', self.ir_chart),
+                                                 ('Encoder counts/sec - left red, right blue', self.encoder_chart))):
+            ttk.Label(chart_frame, text=title).grid(column=column, row=0, padx=5)
+            chart.canvas.grid(column=column, row=1, padx=5, pady=(0, 5))
+
+    def chart_sample(self, chart, name, value):
+        """
+        Add a sample to a chart and schedule the charts to be redrawn at the display rate
+        :param chart: StripChart
+        :param name: channel name
+        :param value: sample value
+        :return:
+        """
+        chart.append(name, value)
+        if not self.charts_scheduled:
+            self.charts_scheduled = True
+            self.root.after(DISPLAY_INTERVAL, self.redraw_charts)
+
+    def redraw_charts(self):
+        """
+        Redraw the charts that have new samples
+        :return:
+        """
+        self.charts_scheduled = False
+        for chart in self.charts:
+            chart.redraw()
+
+    # noinspection PyUnusedLocal
+    def subscriber_readable(self, fd, mask):
+        """
+        This method is called by Tk when the subscriber's file descriptor becomes readable
+        :param fd: zmq file descriptor
+        :param mask: Tk file event mask
+        :return:
+        """
+        self.get_message()
+
     def get_message(self):
         """
-        This method is called from the tkevent loop "after" call. It will poll for new zeromq messages
+        Process the waiting zeromq messages.
+        The zmq file descriptor is edge triggered, so every pending message must be read before returning.
+        At most MESSAGE_BATCH messages are processed at a time so that the GUI stays responsive,
+        and the rest are processed after Tk has handled its other events.
         :return:
         """
         try:
-            data = self.subscriber.recv_multipart(zmq.NOBLOCK)
-            self.incoming_message_processing(data[0].decode(), umsgpack.unpackb(data[1]))
-            time.sleep(.001)
-            self.root.after(1, self.get_message)
-
-        except zmq.error.Again:
-            try:
-                time.sleep(.001)
-                self.root.after(1, self.get_message)
-
-            except KeyboardInterrupt:
-                self.root.destroy()
-                self.publisher.close()
-                self.subscriber.close()
-                self.context.term()
-                sys.exit(0)
+            for _ in range(MESSAGE_BATCH):
+                if not self.subscriber.getsockopt(zmq.EVENTS) & zmq.POLLIN:
+                    break
+                data = self.subscriber.recv_multipart(zmq.NOBLOCK)
+                self.incoming_message_processing(data[0].decode(), umsgpack.unpackb(data[1]))
+            else:
+                self.root.after(0, self.get_message)
+                return
+
+            if self.polling:
+                self.root.after(10, self.get_message)
+
         except KeyboardInterrupt:
             self.root.destroy()
             self.publisher.close()
@@ -557,72 +672,191 @@ class Xitk(XideKit):
             self.context.term()
             sys.exit(0)
 
+    def register_builtin_reports(self):
+        """
+        Create the report handler table with the reports published by the robot controller
+        :return:
+        """
+        # report handlers keyed by (topic, info_type)
+        self.report_handlers = {}
+
+        # reports shown by setting one variable to one payload field
+        for info_type, variable, field in (('left_bumper', self.left_bumper, 'state'),
+                                           ('right_bumper', self.right_bumper, 'state'),
+                                           ('push_button', self.push_button, 'state'),
+                                           ('accel_pl', self.accel_orientation, 'state'),
+                                           ('accel_tap', self.accel_bumper, 'state')):
+            self.register_report_handler(info_type, functools.partial(self.show_field, variable, field))
+
+        for info_type, variable in (('ir1', self.line_follower_1), ('ir2', self.line_follower_2),
+                                    ('ir3', self.line_follower_3)):
+            self.register_report_handler(info_type, functools.partial(self.show_ir, variable))
+
+        self.register_report_handler('telemetry', self.show_telemetry)
+        self.register_report_handler('accel_axis', self.show_accel_axis)
+        self.register_report_handler('accel_xyz', self.show_accel_xyz)
+        self.register_report_handler('accel_packed', self.show_accel_packed)
+        self.register_report_handler('encoders', self.show_encoders)
+
+    def register_report_handler(self, info_type, handler, topic='reporter'):
+        """
+        Route a report to a handler. Registering a report again replaces its handler.
+        :param info_type: report info_type
+        :param handler: function called with the topic and payload
+        :param topic: topic the report is published with. The topic must also be subscribed to.
+        :return:
+        """
+        self.report_handlers[(topic, info_type)] = handler
+
     def incoming_message_processing(self, topic, payload):
         """
-        Process incoming messages. Currently, the only topic expected is reporter.
-        If others are expected, modify this method.
+        Process incoming messages by calling the handler registered for their topic and info_type.
         :param topic: message topic
         :param payload: message payload
         :return:
         """
+        handler = self.report_handlers.get((topic, payload.get('info_type')))
+        if handler:
+            handler(topic, payload)
+        else:
+            print('unknown info type')
 
-        if topic == 'reporter':
-            # get info_type
-            info_type = payload['info_type']
-            if info_type == 'left_bumper':
-                self.left_bumper.set(payload['state'])
-            elif info_type == 'right_bumper':
-                self.right_bumper.set(payload['state'])
-            elif info_type == 'push_button':
-                self.push_button.set(payload['state'])
-            elif info_type == 'ir1':
-                self.line_follower_1.set(payload['data'])
-            elif info_type == 'ir2':
-                self.line_follower_2.set(payload['data'])
-            elif info_type == 'ir3':
-                self.line_follower_3.set(payload['data'])
-            elif info_type == 'accel_axis':
-                if self.axis_units.get() == 'Raw':
-                    self.x_axis.set(payload['raw_x'])
-                    self.y_axis.set(payload['raw_y'])
-                    self.z_axis.set(payload['raw_z'])
-                elif self.axis_units.get() == 'Gs':
-                    self.x_axis.set(payload['xg'])
-                    self.y_axis.set(payload['yg'])
-                    self.z_axis.set(payload['zg'])
-                else:
-                    self.x_axis.set(payload['angle_x'])
-                    self.y_axis.set(payload['angle_y'])
-                    self.z_axis.set(payload['angle_z'])
-            elif info_type == 'accel_pl':
-                self.accel_orientation.set(payload['state'])
-            elif info_type == 'accel_tap':
-                self.accel_bumper.set(payload['state'])
-            elif info_type == 'encoders':
-                self.left_motor_encoder.set(self.left_motor_encoder.get() + payload['left'])
-                self.right_motor_encoder.set(self.right_motor_encoder.get() + payload['right'])
-
-                check_state = self.encoder_stop_state.get()
-                # if the stop motors on ... is checked in the right panel, when the valid is achieved,
-                # a stop command is sent to the robot, the spin box is disabled.
-
-                # This is effectively a one shot and the check box needs to be selected again, which will
-                # automatically set the counts to zero
-                if check_state != 0:
-                    stop = False
-                    if self.left_motor_encoder.get() >= self.encoder_counter.get():
-                        stop = True
-                    if self.right_motor_encoder.get() >= self.encoder_counter.get():
-                        stop = True
-                    if stop:
-                        message = {"command": "stop", "stop_type": self.stop_type.get()}
-                        self.publish_payload(message, 'robot' + self.robot_number.get())
-                        self.encoder_stop_state.set(0)
-                        self.spinbox.configure(state=DISABLED)
-                        self.left_motor_encoder.set(0)
-                        self.right_motor_encoder.set(0)
-            else:
-                print('unknown info type')
+    # noinspection PyUnusedLocal
+    def show_field(self, variable, field, topic, payload):
+        """
+        Show one field of a report
+        :param variable: Tk variable showing the field
+        :param field: payload field
+        :param topic: message topic
+        :param payload: message payload
+        :return:
+        """
+        self.render.set(variable, payload[field])
+
+    # noinspection PyUnusedLocal
+    def show_ir(self, variable, topic, payload):
+        """
+        Show a line follower reading and add it to the chart
+        :param variable: Tk variable showing the reading
+        :param topic: message topic
+        :param payload: message payload
+        :return:
+        """
+        self.render.set(variable, payload['data'])
+        self.chart_sample(self.ir_chart, payload['info_type'], payload['data'])
+
+    def show_telemetry(self, topic, payload):
+        """
+        A batch of reports - process each one as if it arrived on its own
+        :param topic: message topic
+        :param payload: message payload
+        :return:
+        """
+        for reading in payload['readings']:
+            self.incoming_message_processing(topic, reading)
+
+    # noinspection PyUnusedLocal
+    def show_accel_axis(self, topic, payload):
+        """
+        Show a legacy accelerometer report in the selected units
+        :param topic: message topic
+        :param payload: message payload
+        :return:
+        """
+        self.chart_sample(self.accel_chart, 'x', float(payload['xg']))
+        self.chart_sample(self.accel_chart, 'y', float(payload['yg']))
+        self.chart_sample(self.accel_chart, 'z', float(payload['zg']))
+
+        if self.axis_units.get() == 'Raw':
+            self.render.set(self.x_axis, payload['raw_x'])
+            self.render.set(self.y_axis, payload['raw_y'])
+            self.render.set(self.z_axis, payload['raw_z'])
+        elif self.axis_units.get() == 'Gs':
+            self.render.set(self.x_axis, payload['xg'])
+            self.render.set(self.y_axis, payload['yg'])
+            self.render.set(self.z_axis, payload['zg'])
+        else:
+            self.render.set(self.x_axis, payload['angle_x'])
+            self.render.set(self.y_axis, payload['angle_y'])
+            self.render.set(self.z_axis, payload['angle_z'])
+
+    # noinspection PyUnusedLocal
+    def show_accel_xyz(self, topic, payload):
+        raw = payload['raw']
+        self.show_axes(raw[0], raw[1], raw[2], payload['scale'])
+
+    # noinspection PyUnusedLocal
+    def show_accel_packed(self, topic, payload):
+        self.show_axes(*ACCEL_PACKED_STRUCT.unpack(payload['data']))
+
+    # noinspection PyUnusedLocal
+    def show_encoders(self, topic, payload):
+        """
+        Add the encoder counts to the totals and stop the robot if the selected count is reached
+        :param topic: message topic
+        :param payload: message payload
+        :return:
+        """
+        self.encoder_totals[0] += payload['left']
+        self.encoder_totals[1] += payload['right']
+        self.render.set(self.left_motor_encoder, self.encoder_totals[0])
+        self.render.set(self.right_motor_encoder, self.encoder_totals[1])
+
+        # the counts in a report were collected since the robot's previous report, so the rate uses the
+        # robot's report times - the time reports arrive here depends on batching and the network
+        report_time = payload.get('time')
+        if report_time is not None and self.encoder_time is not None and report_time > self.encoder_time:
+            interval = report_time - self.encoder_time
+            self.chart_sample(self.encoder_chart, 'left', payload['left'] / interval)
+            self.chart_sample(self.encoder_chart, 'right', payload['right'] / interval)
+        self.encoder_time = report_time
+
+        check_state = self.encoder_stop_state.get()
+        # if the stop motors on ... is checked in the right panel, when the valid is achieved,
+        # a stop command is sent to the robot, the spin box is disabled.
+
+        # This is effectively a one shot and the check box needs to be selected again, which will
+        # automatically set the counts to zero
+        if check_state != 0:
+            stop = False
+            if self.encoder_totals[0] >= self.encoder_counter.get():
+                stop = True
+            if self.encoder_totals[1] >= self.encoder_counter.get():
+                stop = True
+            if stop:
+                message = {"command": "stop", "stop_type": self.stop_type.get()}
+                self.publish_payload(message, 'robot' + self.robot_number.get())
+                self.encoder_stop_state.set(0)
+                self.spinbox.configure(state=DISABLED)
+                self.zero_encoders()
+
+    def show_axes(self, x, y, z, scale):
+        """
+        Display accelerometer raw counts in the currently selected units and add them to the chart in Gs.
+        Angles are only computed when they are being displayed.
+        :param x: x axis raw count
+        :param y: y axis raw count
+        :param z: z axis raw count
+        :param scale: accelerometer scale factor
+        :return:
+        """
+        self.chart_sample(self.accel_chart, 'x', x / 2048 * scale)
+        self.chart_sample(self.accel_chart, 'y', y / 2048 * scale)
+        self.chart_sample(self.accel_chart, 'z', z / 2048 * scale)
+
+        units = self.axis_units.get()
+        if units == 'Raw':
+            self.render.set(self.x_axis, str(x))
+            self.render.set(self.y_axis, str(y))
+            self.render.set(self.z_axis, str(z))
+        elif units == 'Gs':
+            self.render.set(self.x_axis, str(round(x / 2048 * scale, 2)))
+            self.render.set(self.y_axis, str(round(y / 2048 * scale, 2)))
+            self.render.set(self.z_axis, str(round(z / 2048 * scale, 2)))
+        else:
+            self.render.set(self.x_axis, str(round(math.degrees(math.atan2(x, z)), 2)))
+            self.render.set(self.y_axis, str(round(math.degrees(math.atan2(x, y)), 2)))
+            self.render.set(self.z_axis, str(round(math.degrees(math.atan2(y, z)), 2)))
 
     def keyboard(self, event):
         """
@@ -654,8 +888,17 @@ class Xitk(XideKit):
         Button press handler to reset counters
         :return:
         """
-        self.left_motor_encoder.set(0)
-        self.right_motor_encoder.set(0)
+        self.zero_encoders()
+
+    def zero_encoders(self):
+        """
+        Set the encoder totals to zero
+        :return:
+        """
+        self.encoder_totals = [0, 0]
+        self.encoder_time = None
+        self.render.set(self.left_motor_encoder, 0)
+        self.render.set(self.right_motor_encoder, 0)
 
     def forward_pressed(self, event):
         """
@@ -748,8 +991,7 @@ class Xitk(XideKit):
         else:
             self.spinbox.configure(state=NORMAL)
 
-            self.left_motor_encoder.set(0)
-            self.right_motor_encoder.set(0)
+            self.zero_encoders()
 
     def play_tone(self, event):
         message = {"command": "play_tone", "freq": self.freq.get(),
@@ -781,7 +1023,11 @@ def start_gui():
 
     parser = argparse.ArgumentParser()
 
+    parser.add_argument('-g', dest='plugins', default='None',
+                        help='Comma separated plugin modules that register report handlers')
     parser.add_argument('-r', dest='router_ip_address', default='None', help='Router IP Address')
+    parser.add_argument('-u', dest='ipc_path', default='None',
+                        help='Use the router ipc endpoints with this path prefix instead of TCP - e.g. /tmp/xibot')
 
     args = parser.parse_args()
     kw_options = {}
@@ -789,6 +1035,12 @@ def start_gui():
     if args.router_ip_address != "None":
         kw_options['router_ip_address'] = args.router_ip_address
 
+    if args.plugins != 'None':
+        kw_options['plugins'] = [plugin.strip() for plugin in args.plugins.split(',')]
+
+    if args.ipc_path != 'None':
+        kw_options['router_endpoints'] = ipc_endpoints(args.ipc_path)
+
     Xitk(**kw_options)
 
     # signal handler function called when Control-C occurs
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+
+"""
+Copyright (c) 2016 Alan Yorinks All rights reserved.
+
+This program is free software; you can redistribute it and/or
+modify it under the terms of the GNU  General Public
+License as published by the Free Software Foundation; either
+version 3 of the License, or (at your option) any later version.
+
+This library is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public
+License along with this library; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+import argparse
+import timeit
+
+import numpy as np
+
+# each frame is x msb, x lsb, y msb, y lsb, z msb, z lsb - the layout of OUT_X_MSB through OUT_Z_LSB
+FRAME_LENGTH = 6
+
+# the axis registers are big endian signed 16 bit values with the 12 bit sample left justified
+FRAME_DTYPE = np.dtype('>i2')
+
+
+def decode_axes_batch(frames, scale):
+    """
+    Decode many raw MMA8452Q axis frames at once.
+    This is the array form of RedBotAccel.decode_axes and returns the same values for each frame.
+    :param frames: bytes, bytearray or memoryview holding whole 6 byte frames back to back
+    :param scale: scale factor (fsr) the device was configured with
+    :returns: raw counts as an (n, 3) int16 array and Gs as an (n, 3) float64 array, columns are x, y, z
+    """
+    if len(frames) % FRAME_LENGTH:
+        raise ValueError('frame data length {0} is not a multiple of {1}'.format(len(frames), FRAME_LENGTH))
+
+    # an arithmetic shift of the signed 16 bit value both right justifies and sign extends the sample
+    counts = (np.frombuffer(frames, dtype=FRAME_DTYPE) >> 4).astype(np.int16).reshape(-1, 3)
+    gs = counts / 2048 * scale
+
+    return counts, gs
+
+
+def benchmark():
+    """
+    Compare the batch decoder with the per-sample RedBotAccel.decode_axes path.
+    :return:
+    """
+    # noinspection PyUnresolvedReferences
+    from redbot_accel import RedBotAccel
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', dest='samples', default='8000', help='Number of frames to decode. 8000 = 10s at 800 Hz')
+    parser.add_argument('-s', dest='scale', default='2', help='Scale factor - 2, 4 or 8')
+    parser.add_argument('-t', dest='repeat', default='5', help='Number of timing runs')
+    args = parser.parse_args()
+
+    samples = int(args.samples)
+    scale = int(args.scale)
+    repeat = int(args.repeat)
+
+    frames = np.random.randint(0, 256, samples * FRAME_LENGTH, dtype=np.uint8).tobytes()
+
+    # decode_axes only needs the scale, so no board is required
+    accel = RedBotAccel(None, 0x1d, scale, 0)
+
+    def scalar():
+        return [accel.decode_axes(frames[i:i + FRAME_LENGTH]) for i in range(0, len(frames), FRAME_LENGTH)]
+
+    def batch():
+        return decode_axes_batch(frames, scale)
+
+    # make sure both paths agree before timing them
+    counts, gs = batch()
+    expected = np.array(scalar())
+    if not (np.array_equal(counts, expected[:, :3]) and np.allclose(gs, expected[:, 3:])):
+        print('batch and scalar decoders disagree')
+        return
+
+    scalar_time = min(timeit.repeat(scalar, number=1, repeat=repeat))
+    batch_time = min(timeit.repeat(batch, number=1, repeat=repeat))
+
+    print('{0} frames'.format(samples))
+    print('scalar: {0:.3f} ms  {1:.3f} us/frame'.format(scalar_time * 1000, scalar_time / samples * 1000000))
+    print('batch:  {0:.3f} ms  {1:.3f} us/frame'.format(batch_time * 1000, batch_time / samples * 1000000))
+    print('speedup: {0:.1f}x'.format(scalar_time / batch_time))
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,87 @@
+"""
+Copyright (c) 2016 Alan Yorinks All rights reserved.
+
+This program is free software; you can redistribute it and/or
+modify it under the terms of the GNU  General Public
+License as published by the Free Software Foundation; either
+version 3 of the License, or (at your option) any later version.
+
+This library is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public
+License along with this library; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+import asyncio
+from collections import deque
+
+
+class CommandMailbox:
+    """
+    This class holds robot commands waiting to be dispatched.
+    Only the latest motion command is kept - a new move_robot or stop replaces any move_robot still waiting.
+    A stop is never dropped by a later move_robot and is placed ahead of all other waiting commands.
+    Other commands are dispatched in order of arrival.
+    """
+
+    def __init__(self):
+        # entries are [topic, payload, arrival time]
+        self.pending = deque()
+        self.ready = asyncio.Event()
+
+        # statistics
+        self.dropped = 0
+        self.max_depth = 0
+
+    def put(self, topic, payload, arrival_time):
+        """
+        Add a command, removing any waiting commands that it supersedes.
+        :param topic: message topic
+        :param payload: message payload
+        :param arrival_time: time the message was received
+        :return:
+        """
+        command = payload.get('command')
+
+        if command == 'move_robot':
+            self.remove(lambda entry: entry[1].get('command') == 'move_robot')
+            self.pending.append([topic, payload, arrival_time])
+        elif command == 'stop':
+            self.remove(lambda entry: entry[1].get('command') in ('move_robot', 'stop'))
+            self.pending.appendleft([topic, payload, arrival_time])
+        else:
+            self.pending.append([topic, payload, arrival_time])
+
+        if len(self.pending) > self.max_depth:
+            self.max_depth = len(self.pending)
+        self.ready.set()
+
+    def remove(self, superseded):
+        """
+        Drop waiting commands and count them.
+        :param superseded: function that returns True for entries to drop
+        :return:
+        """
+        keep = [entry for entry in self.pending if not superseded(entry)]
+        self.dropped += len(self.pending) - len(keep)
+        self.pending = deque(keep)
+
+    async def get(self):
+        """
+        Wait for a command.
+        :return: [topic, payload, arrival time]
+        """
+        while not self.pending:
+            self.ready.clear()
+            await self.ready.wait()
+        return self.pending.popleft()
+
+    def depth(self):
+        """
+        :return: number of commands waiting
+        """
+        return len(self.pending)
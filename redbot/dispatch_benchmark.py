@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+
+"""
+Copyright (c) 2016 Alan Yorinks All rights reserved.
+
+This program is free software; you can redistribute it and/or
+modify it under the terms of the GNU  General Public
+License as published by the Free Software Foundation; either
+version 3 of the License, or (at your option) any later version.
+
+This library is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public
+License along with this library; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+import argparse
+import asyncio
+import time
+
+# noinspection PyUnresolvedReferences
+from redbot_controller import RedBotController
+# noinspection PyUnresolvedReferences
+from xirb import XIRB
+
+# the commands the GUI sends, in roughly the proportions a driver produces them
+MESSAGES = [{'command': 'move_robot', 'direction': 'forward', 'speed': 200},
+            {'command': 'move_robot', 'direction': 'left', 'speed': 150},
+            {'command': 'move_robot', 'direction': 'spin_right', 'speed': 180},
+            {'command': 'move_robot', 'direction': 'reverse', 'speed': 120},
+            {'command': 'stop', 'stop_type': 'coast'},
+            {'command': 'move_robot', 'direction': 'right', 'speed': 150},
+            {'command': 'stop', 'stop_type': 'brake'},
+            {'command': 'set_led', 'state': 1},
+            {'command': 'play_tone', 'freq': 1000, 'duration': 500}]
+
+
+class NullController:
+    """
+    Stands in for RedBotController so that only the dispatch is timed
+    """
+    FORWARD = RedBotController.FORWARD
+    REVERSE = RedBotController.REVERSE
+    COAST = RedBotController.COAST
+    BRAKE = RedBotController.BRAKE
+
+    async def drive(self, left_command, left_speed, right_command, right_speed):
+        pass
+
+    async def play_tone(self, freq, duration):
+        pass
+
+    async def set_led(self, state):
+        pass
+
+
+async def chain_dispatch(rbc, topic, payload):
+    """
+    The if/elif dispatch that the handler table replaced, kept for comparison
+    """
+    command = payload['command']
+
+    if command == 'move_robot':
+        operation = payload['direction']
+        speed = int(payload['speed'])
+        if operation == 'forward':
+            await rbc.drive(rbc.FORWARD, speed, rbc.FORWARD, speed)
+        elif operation == 'reverse':
+            await rbc.drive(rbc.REVERSE, speed, rbc.REVERSE, speed)
+        elif operation == 'spin_left':
+            await rbc.drive(rbc.FORWARD, speed, rbc.REVERSE, speed)
+        elif operation == 'spin_right':
+            await rbc.drive(rbc.REVERSE, speed, rbc.FORWARD, speed)
+        elif operation == 'left':
+            await rbc.drive(rbc.FORWARD, speed, None, None)
+        elif operation == 'right':
+            await rbc.drive(None, None, rbc.FORWARD, speed)
+    elif command == 'stop':
+        if payload['stop_type'] == 'brake':
+            await rbc.drive(rbc.BRAKE, 0, rbc.BRAKE, 0)
+        elif payload['stop_type'] == 'coast':
+            await rbc.drive(rbc.COAST, 0, rbc.COAST, 0)
+    elif command == 'play_tone':
+        await rbc.play_tone(payload['freq'], payload['duration'])
+    elif command == 'set_led':
+        await rbc.set_led(payload['state'])
+
+
+async def time_dispatch(dispatch, messages):
+    """
+    :param dispatch: coroutine function called with a controller, topic and payload
+    :param messages: number of messages to dispatch
+    :return: seconds per message
+    """
+    rbc = NullController()
+    start = time.perf_counter()
+    for i in range(messages):
+        await dispatch(rbc, 'robot1', MESSAGES[i % len(MESSAGES)])
+    return (time.perf_counter() - start) / messages
+
+
+def dispatch_benchmark():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', dest='messages', default='200000', help='Number of messages to dispatch')
+    parser.add_argument('-t', dest='repeat', default='5', help='Number of timing runs')
+    args = parser.parse_args()
+
+    # only the command handler table is needed - no router or boards
+    xirb = XIRB.__new__(XIRB)
+    xirb.register_builtin_commands()
+
+    loop = asyncio.get_event_loop()
+    messages = int(args.messages)
+    repeat = int(args.repeat)
+
+    chain = min(loop.run_until_complete(time_dispatch(chain_dispatch, messages)) for _ in range(repeat))
+    table = min(loop.run_until_complete(time_dispatch(xirb.dispatch_command, messages)) for _ in range(repeat))
+
+    print('{0} messages per run, best of {1}'.format(messages, repeat))
+    print('if/elif chain:  {0:.3f} us/message'.format(chain * 1000000))
+    print('handler table:  {0:.3f} us/message'.format(table * 1000000))
+
+
+if __name__ == '__main__':
+    dispatch_benchmark()
@@ -0,0 +1,108 @@
+"""
+Copyright (c) 2016 Alan Yorinks All rights reserved.
+
+This program is free software; you can redistribute it and/or
+modify it under the terms of the GNU  General Public
+License as published by the Free Software Foundation; either
+version 3 of the License, or (at your option) any later version.
+
+This library is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public
+License along with this library; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+from pymata_aio.private_constants import PrivateConstants
+
+
+class PinShadow:
+    """
+    This class wraps a pymata_core instance and remembers the last value written to each pin.
+    A digital_write or analog_write of the value a pin already has is dropped instead of being sent to the board.
+    All other pymata_core methods are passed straight through.
+
+    pymata_core keeps the digital output port values in a class attribute that all instances share.
+    Each PinShadow keeps its own port values and builds the digital message from them, so that several
+    boards can be driven from one process.
+    """
+
+    def __init__(self, board):
+        """
+        :param board: pymata_core instance
+        """
+        self.board = board
+
+        # last value written, keyed by (write type, pin)
+        self.pin_values = {}
+
+        # hits are writes that were dropped, misses are writes that were sent
+        self.hits = 0
+        self.misses = 0
+
+        # this board's digital output port values
+        self.output_port_pins = [0] * len(PrivateConstants.DIGITAL_OUTPUT_PORT_PINS)
+
+    def __getattr__(self, name):
+        return getattr(self.board, name)
+
+    async def digital_write(self, pin, value):
+        """
+        Set a digital pin unless it already has the value.
+        :param pin: pin number
+        :param value: pin value
+        :return:
+        """
+        if self.changed(('digital', pin), value):
+            # a digital message sets all 8 pins of a port, so it is built from this board's port value
+            port = pin // 8
+            mask = 1 << (pin % 8)
+            if value == 1:
+                self.output_port_pins[port] |= mask
+            else:
+                self.output_port_pins[port] &= ~mask
+
+            command = (PrivateConstants.DIGITAL_MESSAGE + port, self.output_port_pins[port] & 0x7f,
+                       (self.output_port_pins[port] >> 7) & 0x7f)
+            await self.board._send_command(command)
+
+    async def analog_write(self, pin, value):
+        """
+        Set a PWM pin unless it already has the value.
+        :param pin: PWM pin number
+        :param value: pin value
+        :return:
+        """
+        if self.changed(('analog', pin), value):
+            await self.board.analog_write(pin, value)
+
+    async def set_pin_mode(self, pin_number, pin_state, callback=None, callback_type=None):
+        """
+        Set the pin mode. Changing the mode may change the pin's output, so its shadow value is forgotten.
+        :param pin_number: pin number
+        :param pin_state: pin mode
+        :param callback: callback function
+        :param callback_type: callback type
+        :return:
+        """
+        self.pin_values.pop(('digital', pin_number), None)
+        self.pin_values.pop(('analog', pin_number), None)
+        await self.board.set_pin_mode(pin_number, pin_state, callback, callback_type)
+
+    def changed(self, key, value):
+        """
+        Record the value for a pin and count the write as a hit or a miss.
+        :param key: (write type, pin number)
+        :param value: value being written
+        :return: True if the write must be sent to the board
+        """
+        if self.pin_values.get(key) == value:
+            self.hits += 1
+            return False
+
+        self.pin_values[key] = value
+        self.misses += 1
+        return True
@@ -19,6 +19,8 @@ Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
 """
 
 import asyncio
+from collections import deque
+
 from pymata_aio.pymata_core import PymataCore
 from pymata_aio.constants import Constants
 
@@ -74,12 +76,26 @@ class RedBotAccel:
         'OFF_Z': 0x31
     }
 
-    def __init__(self, board, address, scale, output_data_rate):
+    # STATUS followed by the six axis data registers can be fetched with a single auto-increment read.
+    BURST_REGISTER = 0x00
+    BURST_LENGTH = 7
+
+    # contents of the configuration registers that start() modifies, following a reset
+    RESET_DEFAULTS = {
+        'CTRL_REG1': 0x00,
+        'XYZ_DATA_CFG': 0x00,
+        'PL_CFG': 0x80
+    }
+
+    def __init__(self, board, address, scale, output_data_rate, read_timeout=1.0, fast_start=False):
         """
 
         :param address: Address of the device
         :param scale: scale factor
         :param output_data_rate: output data rate
+        :param read_timeout: seconds to wait for an i2c read reply before raising asyncio.TimeoutError
+        :param fast_start: If True, start() assumes the configuration registers hold their reset values after
+                           the device is reset, instead of reading them.
         :return: no return value
         """
 
@@ -107,9 +123,23 @@ class RedBotAccel:
         self.p_l = None
         self.tap = None
 
-        # When a read is performed,, data is returned through a call back to this structure.
-        # It should be cleared after data is consumed
-        self.callback_data = []
+        # Outstanding i2c reads. Each read request is given a future that is placed in a queue keyed
+        # by (device address, register). The reply callback resolves the oldest future for its key.
+        self.pending_reads = {}
+
+        self.read_timeout = read_timeout
+
+        # Known contents of configuration registers, keyed by register. Read-modify-write updates use
+        # the known value instead of reading the register again.
+        self.registers = {}
+        self.fast_start = fast_start
+
+        # Handlers for replies that arrive without an outstanding read, as is the case when
+        # firmata is reading continuously. Keyed by (device address, register).
+        self.stream_handlers = {}
+
+        # last portrait/landscape value reported while reading continuously
+        self.last_pl_status = None
 
         # beginning of data returned is located at position 4
         # 0 is the device address
@@ -125,6 +155,11 @@ class RedBotAccel:
         register = self.MMA8452Q_Register['CTRL_REG2']
         await self.board.i2c_write_request(self.address, [register, 0x40])
 
+        self.registers = {}
+        if self.fast_start:
+            for name, value in self.RESET_DEFAULTS.items():
+                self.registers[self.MMA8452Q_Register[name]] = value
+
         # verify the device by sending a WHO AM I command and checking the results
         id_board = await self.check_who_am_i()
         if not id_board:
@@ -153,11 +188,61 @@ class RedBotAccel:
 
     async def data_val(self, data):
         """
-        This is the callback method used to save read results
+        This is the callback method used to save read results.
+        The reply is handed to the oldest outstanding read for the same address and register.
         :param data: Data returned from the device
         :return: No return value
         """
-        self.callback_data = data
+        key = (data[0], data[1])
+        waiting = self.pending_reads.get(key)
+        while waiting:
+            future = waiting.popleft()
+            # skip reads that have already timed out
+            if not future.done():
+                future.set_result(data)
+                return
+
+        handler = self.stream_handlers.get(key)
+        if handler:
+            await handler(data)
+
+    async def read_register(self, register, number_of_bytes=1):
+        """
+        Issue an i2c read request and wait for its reply.
+        Several reads may be outstanding at the same time.
+        :param register: register to read
+        :param number_of_bytes: number of bytes to read
+        :returns: reply data - address, register followed by the data bytes
+        """
+        future = asyncio.get_event_loop().create_future()
+        self.pending_reads.setdefault((self.address, register), deque()).append(future)
+
+        await self.board.i2c_read_request(self.address, register, number_of_bytes,
+                                          Constants.I2C_READ | Constants.I2C_END_TX_MASK,
+                                          self.data_val, Constants.CB_TYPE_ASYNCIO)
+
+        return await asyncio.wait_for(future, self.read_timeout)
+
+    async def read_config_register(self, register):
+        """
+        Get the contents of a configuration register, reading it from the device only if it is not already known.
+        :param register: register to read
+        :return: register value
+        """
+        if register not in self.registers:
+            reply = await self.read_register(register)
+            self.registers[register] = reply[self.data_start]
+        return self.registers[register]
+
+    async def write_config_register(self, register, value):
+        """
+        Write a configuration register and remember its contents.
+        :param register: register to write
+        :param value: register value
+        :return: No return value
+        """
+        self.registers[register] = value
+        await self.board.i2c_write_request(self.address, [register, value])
 
     async def check_who_am_i(self):
         """
@@ -166,11 +251,10 @@ class RedBotAccel:
         """
         register = self.MMA8452Q_Register['WHO_AM_I']
 
-        await self.board.i2c_read_request(self.address, register, 1,
-                                               Constants.I2C_READ | Constants.I2C_END_TX_MASK,
-                                               self.data_val, Constants.CB_TYPE_ASYNCIO)
-        # await asyncio.sleep(1)
-        reply = await self.wait_for_read_result()
+        try:
+            reply = await self.read_register(register)
+        except asyncio.TimeoutError:
+            return False
 
         if reply[self.data_start] == self.device_id:
             rval = True
@@ -184,16 +268,11 @@ class RedBotAccel:
         :return: No return value
         """
         register = self.MMA8452Q_Register['CTRL_REG1']
-        await self.board.i2c_read_request(self.address, register, 1,
-                                               Constants.I2C_READ | Constants.I2C_END_TX_MASK,
-                                               self.data_val, Constants.CB_TYPE_ASYNCIO)
+        ctrl1 = await self.read_config_register(register)
 
-        ctrl1 = await self.wait_for_read_result()
+        ctrl1 &= ~0x01
 
-        ctrl1 = (ctrl1[self.data_start]) & ~0x01
-        self.callback_data = []
-
-        await self.board.i2c_write_request(self.address, [register, ctrl1])
+        await self.write_config_register(register, ctrl1)
 
     async def set_scale(self, scale):
         """
@@ -203,15 +282,10 @@ class RedBotAccel:
         :return: No return value
         """
         register = self.MMA8452Q_Register['XYZ_DATA_CFG']
-        await self.board.i2c_read_request(self.address, register, 1,
-                                               Constants.I2C_READ | Constants.I2C_END_TX_MASK,
-                                               self.data_val, Constants.CB_TYPE_ASYNCIO)
-
-        config_reg = await self.wait_for_read_result()
-        config_reg = config_reg[self.data_start]
+        config_reg = await self.read_config_register(register)
         config_reg &= 0xFC  # Mask out scale bits
         config_reg |= (scale >> 2)
-        await self.board.i2c_write_request(self.address, [register, config_reg])
+        await self.write_config_register(register, config_reg)
 
     async def set_output_data_rate(self, output_data_rate):
         """
@@ -222,16 +296,11 @@ class RedBotAccel:
         """
         # self.standby()
         register = self.MMA8452Q_Register['CTRL_REG1']
-        await self.board.i2c_read_request(self.address, register, 1,
-                                               Constants.I2C_READ | Constants.I2C_END_TX_MASK,
-                                               self.data_val, Constants.CB_TYPE_ASYNCIO)
-
-        control_reg = await self.wait_for_read_result()
-        control_reg = control_reg[self.data_start]
+        control_reg = await self.read_config_register(register)
 
         control_reg &= 0xC7  # Mask out data rate bits
         control_reg |= (output_data_rate << 3)
-        await self.board.i2c_write_request(self.address, [register, control_reg])
+        await self.write_config_register(register, control_reg)
 
     async def setup_portrait_landscape(self):
         """
@@ -241,15 +310,11 @@ class RedBotAccel:
         """
         register = self.MMA8452Q_Register['PL_CFG']
 
-        await self.board.i2c_read_request(self.address, register, 1,
-                                               Constants.I2C_READ | Constants.I2C_END_TX_MASK,
-                                               self.data_val, Constants.CB_TYPE_ASYNCIO)
-
-        control_reg = await self.wait_for_read_result()
-        control_reg = control_reg[self.data_start] | 0x40
+        control_reg = await self.read_config_register(register)
+        control_reg |= 0x40
 
         #  1. Enable P/L
-        await self.board.i2c_write_request(self.address, [register, control_reg])
+        await self.write_config_register(register, control_reg)
 
         register = self.MMA8452Q_Register['PL_COUNT']
 
@@ -265,23 +330,25 @@ class RedBotAccel:
         :returns: See above.
         """
         register = self.MMA8452Q_Register['PL_STATUS']
-        await self.board.i2c_read_request(self.address, register, 1,
-                                               Constants.I2C_READ | Constants.I2C_END_TX_MASK,
-                                               self.data_val, Constants.CB_TYPE_ASYNCIO)
-
-        pl_status = await self.wait_for_read_result()
-        pl_status = pl_status[self.data_start]
-        if pl_status & 0x40:  # Z-tilt lockout
-            pl_status = self.LOCKOUT
-        else:  # Otherwise return LAPO status
-            pl_status = (pl_status & 0x6) >> 1
+        pl_status = await self.read_register(register)
+        pl_status = self.decode_portrait_landscape(pl_status[self.data_start])
 
         if callback:
             await callback(pl_status)
-        await asyncio.sleep(.001)
 
         return pl_status
 
+    def decode_portrait_landscape(self, pl_status):
+        """
+        Convert the contents of the PL_STATUS register to an orientation value.
+        :param pl_status: PL_STATUS register value
+        :returns: PORTRAIT_U, PORTRAIT_D, LANDSCAPE_R, LANDSCAPE_L or LOCKOUT
+        """
+        if pl_status & 0x40:  # Z-tilt lockout
+            return self.LOCKOUT
+        else:  # Otherwise return LAPO status
+            return (pl_status & 0x6) >> 1
+
     async def setup_tap(self, x_ths, y_ths, z_ths):
         """
         This method sets the tap thresholds.
@@ -341,37 +408,36 @@ class RedBotAccel:
         """
         # self.board.sleep(1)
         register = self.MMA8452Q_Register['PULSE_SRC']
-        await self.board.i2c_read_request(self.address, register, 1,
-                                               Constants.I2C_READ | Constants.I2C_END_TX_MASK,
-                                               self.data_val, Constants.CB_TYPE_ASYNCIO)
-
-        tap_status = await self.wait_for_read_result()
-        tap_status = tap_status[self.data_start]
-        if tap_status & 0x80:
-            tap_status &= 0x7f
-        else:
-            tap_status = 0
+        tap_status = await self.read_register(register)
+        tap_status = self.decode_tap(tap_status[self.data_start])
 
         if callback:
             await callback(tap_status)
-        await asyncio.sleep(.001)
         return tap_status
 
+    # noinspection PyMethodMayBeStatic
+    def decode_tap(self, tap_status):
+        """
+        Convert the contents of the PULSE_SRC register to a tap value.
+        :param tap_status: PULSE_SRC register value
+        :returns: 0 or lower 7 bits of the PULSE_SRC register.
+        """
+        if tap_status & 0x80:
+            return tap_status & 0x7f
+        else:
+            return 0
+
     async def set_active(self):
         """
         This method sets the device to the active state
         :return: No return value.
         """
         register = self.MMA8452Q_Register['CTRL_REG1']
-        await self.board.i2c_read_request(self.address, register, 1,
-                                               Constants.I2C_READ | Constants.I2C_END_TX_MASK,
-                                               self.data_val, Constants.CB_TYPE_ASYNCIO)
+        control_reg = await self.read_config_register(register)
 
-        control_reg = await self.wait_for_read_result()
+        control_reg |= 0x01
 
-        control_reg = control_reg[self.data_start] | 0x01
-
-        await self.board.i2c_write_request(self.address, [register, control_reg])
+        await self.write_config_register(register, control_reg)
 
     async def available(self):
         """
@@ -379,11 +445,7 @@ class RedBotAccel:
         :return: Returns 0 if not available. 1 if it is available
         """
         register = self.MMA8452Q_Register['STATUS']
-        await self.board.i2c_read_request(self.address, register, 1,
-                                               Constants.I2C_READ | Constants.I2C_END_TX_MASK,
-                                               self.data_val, Constants.CB_TYPE_ASYNCIO)
-
-        avail = await self.wait_for_read_result()
+        avail = await self.read_register(register)
         avail = (avail[self.data_start] & 0x08) >> 3
 
         return avail
@@ -400,62 +462,115 @@ class RedBotAccel:
         Call available() first to make sure new data is really available.
         """
         register = self.MMA8452Q_Register['OUT_X_MSB']
-        await self.board.i2c_read_request(self.address, register, 6,
-                                               Constants.I2C_READ | Constants.I2C_END_TX_MASK,
-                                               self.data_val, Constants.CB_TYPE_ASYNCIO)
 
         # get x y z data
-        xyz = await self.wait_for_read_result()
-        await asyncio.sleep(.1)
+        xyz = await self.read_register(register, 6)
 
-        # string off address and register bytes
-        xyz = xyz[2:]
+        # strip off address and register bytes
+        axes = self.decode_axes(xyz[self.data_start:])
 
-        xmsb = xyz[0]
-        xlsb = xyz[1]
-        ymsb = xyz[2]
-        ylsb = xyz[3]
-        zmsb = xyz[4]
-        zlsb = xyz[5]
+        if callback:
+            await callback(axes)
+
+        return axes
 
-        xa = int((xmsb << 8) | xlsb) >> 4
+    async def read_burst(self, callback=None):
+        """
+        Read STATUS and the x, y and z data registers with a single i2c transaction.
+        This replaces a call to available() followed by a call to read().
+        :param callback: Callback function
+        :returns: None if no new data is available, otherwise the same list returned by read()
+        """
+        burst = await self.read_register(self.BURST_REGISTER, self.BURST_LENGTH)
+        return await self.decode_burst(burst, callback)
 
-        if xmsb > 127:
-            xa = 4095 - xa
-            xa = ~xa + 1
+    async def decode_burst(self, burst, callback=None):
+        """
+        Decode the reply to a burst read.
+        :param burst: reply data - address, register, STATUS and the 6 data bytes
+        :param callback: Callback function
+        :returns: None if no new data is available, otherwise the same list returned by read()
+        """
+        status = burst[self.data_start]
+        if not status & 0x08:
+            return None
 
-        ya = int(((ymsb << 8) | ylsb)) >> 4
+        axes = self.decode_axes(burst[self.data_start + 1:])
 
-        if ymsb > 127:
-            ya = 4095 - ya
-            ya = ~ya + 1
+        if callback:
+            await callback(axes)
 
-        za = int((zmsb << 8) | zlsb) >> 4
+        return axes
 
-        if zmsb > 127:
-            za = 4095 - za
-            za = ~za + 1
+    def decode_axes(self, xyz):
+        """
+        Convert the 6 axis data bytes to raw counts and Gs.
+        Each axis is a 12 bit two's complement value, left justified in an MSB, LSB pair.
+        :param xyz: x msb, x lsb, y msb, y lsb, z msb, z lsb
+        :returns: x,y,z raw (integers) followed by x,y,z corrected ( floating point)
+        """
+        xa = ((xyz[0] << 8) | xyz[1]) >> 4
+        ya = ((xyz[2] << 8) | xyz[3]) >> 4
+        za = ((xyz[4] << 8) | xyz[5]) >> 4
+
+        # sign extend
+        if xa > 2047:
+            xa -= 4096
+        if ya > 2047:
+            ya -= 4096
+        if za > 2047:
+            za -= 4096
 
         cx = xa / 2048 * self.scale
         cy = ya / 2048 * self.scale
         cz = za / 2048 * self.scale
 
-        if callback:
-            await callback([xa, ya, za, cx, cy, cz])
-        await asyncio.sleep(.001)
-
         return [xa, ya, za, cx, cy, cz]
 
-    async def wait_for_read_result(self):
+    async def start_continuous(self, axis_callback, pl_callback=None, tap_callback=None):
         """
-        This is a utility function to wait for return data call back
-        :return: Returns resultant data from callback
+        Have firmata read the burst block, PL_STATUS and PULSE_SRC continuously at its sampling interval.
+        Replies are decoded as they arrive, so no request traffic is needed per sample.
+        Axis data is reported when new data is available, orientation when it changes, and taps when detected.
+        :param axis_callback: Callback function for axis data
+        :param pl_callback: Callback function for portrait/landscape changes
+        :param tap_callback: Callback function for taps
+        :return: No return value.
         """
-        while not self.callback_data:
-            await asyncio.sleep(.001)
-        rval = self.callback_data
-        self.callback_data = []
-        return rval
+        async def burst_handler(data):
+            await self.decode_burst(data, axis_callback)
+
+        async def pl_handler(data):
+            pl_status = self.decode_portrait_landscape(data[self.data_start])
+            if pl_status != self.last_pl_status:
+                self.last_pl_status = pl_status
+                if pl_callback:
+                    await pl_callback(pl_status)
+
+        async def tap_handler(data):
+            tap_status = self.decode_tap(data[self.data_start])
+            if tap_status and tap_callback:
+                await tap_callback(tap_status)
+
+        reads = [(self.BURST_REGISTER, self.BURST_LENGTH, burst_handler),
+                 (self.MMA8452Q_Register['PL_STATUS'], 1, pl_handler),
+                 (self.MMA8452Q_Register['PULSE_SRC'], 1, tap_handler)]
+
+        for register, number_of_bytes, handler in reads:
+            self.stream_handlers[(self.address, register)] = handler
+            await self.board.i2c_read_request(self.address, register, number_of_bytes,
+                                              Constants.I2C_READ_CONTINUOUSLY | Constants.I2C_END_TX_MASK,
+                                              self.data_val, Constants.CB_TYPE_ASYNCIO)
+
+    async def stop_continuous(self):
+        """
+        Stop the continuous reads started with start_continuous.
+        Firmata removes one continuous read of the device for each stop request, so one is sent per read.
+        :return: No return value.
+        """
+        for _ in range(len(self.stream_handlers)):
+            await self.board.i2c_read_request(self.address, 0, 0, Constants.I2C_STOP_READING)
+        self.stream_handlers = {}
 
 
 if __name__ == "__main__":
@@ -17,12 +17,26 @@ Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
 """
 import asyncio
 import math
+import time
 
 from pymata_aio.constants import Constants
 from pymata_aio.pymata_core import PymataCore
 
+try:
+    from importlib.metadata import version as distribution_version
+except ImportError:
+    # Python before 3.8
+    import pkg_resources
+
+    def distribution_version(name):
+        return pkg_resources.get_distribution(name).version
+
 # noinspection PyUnresolvedReferences,PyUnresolvedReferences
 from redbot_accel import RedBotAccel
+# noinspection PyUnresolvedReferences
+from pin_shadow import PinShadow
+# noinspection PyUnresolvedReferences
+from report_formats import ACCEL_PACKED_STRUCT
 
 
 # noinspection PyPep8
@@ -50,81 +64,277 @@ class RedBotController:
     REVERSE = 1
     COAST = 2
     BRAKE = 3
+
+    # motor control pin levels for each motor control command
+    motor_control_levels = {FORWARD: (1, 0), REVERSE: (0, 1), COAST: (0, 0), BRAKE: (1, 1)}
+
     client_ready = False
     accel = None
     lbump_wait = False
     rbump_wait = False
 
-    def __init__(self, board, robot_id=None, robot_message_handler=None):
+    # reports of switch state changes. While batching, every change is kept, in order, so no edge is lost.
+    EVENT_INFO_TYPES = frozenset(['left_bumper', 'right_bumper', 'push_button'])
+
+    # accelerometer axis message formats
+    ACCEL_FORMAT_NUMERIC = 'numeric'
+    ACCEL_FORMAT_PACKED = 'packed'
+    ACCEL_FORMAT_LEGACY = 'legacy'
+
+    # packed accelerometer payload - the layout is shared with the GUIs
+    ACCEL_PACKED_STRUCT = ACCEL_PACKED_STRUCT
+
+    # pymata_aio versions whose start_aio is known to wait for the Arduino reset with time.sleep(arduino_wait)
+    # just before its first get_firmware_version call. start_board only replaces that wait for these versions.
+    RESET_WAIT_PYMATA_VERSIONS = ('2.35',)
+
+    def __init__(self, board, robot_id=None, robot_message_handler=None, accel_continuous=False,
+                 accel_format=ACCEL_FORMAT_NUMERIC, telemetry_interval=0, ir_deadband=0, ir_min_interval=0,
+                 fast_start=False):
         """
         Set up data members of this class
-        :param board: pymata_core instance
+        :param board: pymata_core instance. Pin writes go through a PinShadow so that repeated values are not resent.
         :param robot_id: robot id
         :param robot_message_handler: the instantiator (XIRB)
+        :param accel_continuous: If True, firmata reads the accelerometer continuously and get_accel_data
+                                 should not be called.
+        :param accel_format: Axis message format. 'numeric' publishes raw counts as integers, 'packed'
+                             publishes them as a binary struct and 'legacy' publishes the original
+                             dictionary of formatted strings.
+        :param telemetry_interval: If non-zero, IR, bumper, button and encoder reports are collected and
+                                   published as a single telemetry message every telemetry_interval ms.
+        :param ir_deadband: An IR reading is only published if it differs from the last published reading
+                            by at least this much. Either a single value for all IR sensors or a list of 3.
+        :param ir_min_interval: Minimum time in ms between published readings of an IR sensor.
+                                Either a single value for all IR sensors or a list of 3.
+        :param fast_start: If True, the accelerometer configuration registers are assumed to hold their reset
+                           values after the device is reset instead of being read.
         """
         self.socket = None
-        self.board = board
+        self.board = PinShadow(board)
         self.accel_read_enable = False
         self.robot_id = robot_id
         self.robot_message_handler = robot_message_handler
         self.encoder_count = True
+        self.accel_continuous = accel_continuous
+        self.accel_format = accel_format
+
+        # telemetry batching - switch changes in arrival order, latest report for each other info_type
+        # and encoder counts accumulated since the last flush
+        self.telemetry_interval = telemetry_interval
+        self.telemetry_events = []
+        self.telemetry = {}
+        self.encoder_deltas = [0, 0]
+
+        # ir sensor filtering - per sensor settings, last published reading and time, and suppressed reading counts
+        self.ir_deadband = self.ir_settings('ir_deadband', ir_deadband)
+        self.ir_min_interval = self.ir_settings('ir_min_interval', ir_min_interval)
+        self.ir_last_value = {}
+        self.ir_last_time = {}
+        self.ir_suppressed = {'ir1': 0, 'ir2': 0, 'ir3': 0}
+
+        # seconds spent in each init_red_board step
+        self.startup_times = {}
+        self.fast_start = fast_start
+
+    # noinspection PyMethodMayBeStatic
+    def ir_settings(self, name, setting):
+        """
+        Expand an IR filter setting to a value for each IR sensor
+        :param name: setting name, for the error message
+        :param setting: a single value for all IR sensors or a list of 3
+        :return: dictionary keyed by ir1, ir2 and ir3
+        """
+        if not isinstance(setting, (list, tuple)):
+            setting = [setting]
+        if len(setting) == 1:
+            setting = list(setting) * 3
+        elif len(setting) != 3:
+            raise ValueError('{0} needs 1 or 3 values, not {1}'.format(name, len(setting)))
+        return dict(zip(['ir1', 'ir2', 'ir3'], setting))
 
     async def init_red_board(self):
         """
         Initialize the redboard for all inputs and outputs
+        Pin setup, accelerometer setup and encoder setup do not depend on each other, so they run concurrently.
+        The time taken by each step is kept in startup_times.
         :return:
         """
-        await self.board.start_aio()
+        start_time = time.perf_counter()
+        await self.start_board()
+        self.startup_times['board'] = time.perf_counter() - start_time
 
         # instantiate the redbot accelerometer class
-        self.accel = RedBotAccel(self.board, 0x1d, 2, 0)
+        self.accel = RedBotAccel(self.board, 0x1d, 2, 0, fast_start=self.fast_start)
 
-        #  ir sensors
-        await self.board.set_pin_mode(self.pins["IR_SENSOR_1"], Constants.ANALOG, self.ir1_callback,
-                                      Constants.CB_TYPE_ASYNCIO)
-        await self.board.set_pin_mode(self.pins["IR_SENSOR_2"], Constants.ANALOG, self.ir2_callback,
-                                      Constants.CB_TYPE_ASYNCIO)
-        await self.board.set_pin_mode(self.pins["IR_SENSOR_3"], Constants.ANALOG, self.ir3_callback,
-                                      Constants.CB_TYPE_ASYNCIO)
+        await asyncio.gather(self.timed_startup_step('pins', self.init_pins()),
+                             self.timed_startup_step('accelerometer', self.init_accel()),
+                             self.timed_startup_step('encoders', self.init_encoders()))
 
-        # board LED
-        await self.board.set_pin_mode(self.pins["LED"], Constants.OUTPUT)
+        self.startup_times['total'] = time.perf_counter() - start_time
 
-        # motors
-        await self.board.set_pin_mode(self.pins["LEFT_MOTOR_CONTROL_1"], Constants.OUTPUT)
-        await self.board.set_pin_mode(self.pins["LEFT_MOTOR_CONTROL_2"], Constants.OUTPUT)
-        await self.board.set_pin_mode(self.pins["RIGHT_MOTOR_CONTROL_1"], Constants.OUTPUT)
-        await self.board.set_pin_mode(self.pins["RIGHT_MOTOR_CONTROL_2"], Constants.OUTPUT)
+        if self.telemetry_interval:
+            asyncio.get_event_loop().call_later(self.telemetry_interval / 1000, self.flush_telemetry)
+        return True
 
-        await self.board.set_pin_mode(self.pins["LEFT_MOTOR_SPEED"], Constants.PWM)
+    async def start_board(self):
+        """
+        Start pymata_core without blocking the event loop while the Arduino resets.
+        start_aio waits for the reset with time.sleep, which would also hold up every other board being started.
+        Its wait is set to 0 and the same wait is made with asyncio.sleep instead, when start_aio first asks
+        the board for its firmware version. This depends on the order of the steps in start_aio, so for other
+        pymata_aio versions, or if the attributes involved are missing, start_aio is called unchanged.
+        :return:
+        """
+        board = self.board.board
+        arduino_wait = getattr(board, 'arduino_wait', None)
+        get_firmware_version = getattr(board, 'get_firmware_version', None)
+
+        try:
+            pymata_version = distribution_version('pymata_aio')
+        except Exception:
+            # not installed as a distribution, so the version is unknown
+            pymata_version = None
+
+        if (pymata_version not in self.RESET_WAIT_PYMATA_VERSIONS or not isinstance(arduino_wait, (int, float)) or
+                not asyncio.iscoroutinefunction(get_firmware_version)):
+            await board.start_aio()
+            return
 
-        # set speed to zero
-        await self.board.analog_write(self.pins["LEFT_MOTOR_SPEED"], 0)
+        async def wait_for_reset():
+            # later calls go straight to pymata_core
+            del board.get_firmware_version
+            await asyncio.sleep(arduino_wait)
+            return await get_firmware_version()
+
+        board.arduino_wait = 0
+        board.get_firmware_version = wait_for_reset
+        try:
+            await board.start_aio()
+        finally:
+            board.arduino_wait = arduino_wait
+            board.__dict__.pop('get_firmware_version', None)
+
+    async def timed_startup_step(self, name, step):
+        """
+        Run a startup step and record how long it took
+        :param name: step name
+        :param step: coroutine performing the step
+        :return:
+        """
+        start_time = time.perf_counter()
+        await step
+        self.startup_times[name] = time.perf_counter() - start_time
 
-        await self.board.set_pin_mode(self.pins["RIGHT_MOTOR_SPEED"], Constants.PWM)
+    async def init_pins(self):
+        """
+        Set the pin modes and initial values. All of the pin modes are sent together, followed by all of the
+        initial values.
+        :return:
+        """
+        await asyncio.gather(
+            #  ir sensors
+            self.board.set_pin_mode(self.pins["IR_SENSOR_1"], Constants.ANALOG, self.ir1_callback,
+                                    Constants.CB_TYPE_ASYNCIO),
+            self.board.set_pin_mode(self.pins["IR_SENSOR_2"], Constants.ANALOG, self.ir2_callback,
+                                    Constants.CB_TYPE_ASYNCIO),
+            self.board.set_pin_mode(self.pins["IR_SENSOR_3"], Constants.ANALOG, self.ir3_callback,
+                                    Constants.CB_TYPE_ASYNCIO),
+
+            # board LED
+            self.board.set_pin_mode(self.pins["LED"], Constants.OUTPUT),
+
+            # motors
+            self.board.set_pin_mode(self.pins["LEFT_MOTOR_CONTROL_1"], Constants.OUTPUT),
+            self.board.set_pin_mode(self.pins["LEFT_MOTOR_CONTROL_2"], Constants.OUTPUT),
+            self.board.set_pin_mode(self.pins["RIGHT_MOTOR_CONTROL_1"], Constants.OUTPUT),
+            self.board.set_pin_mode(self.pins["RIGHT_MOTOR_CONTROL_2"], Constants.OUTPUT),
+            self.board.set_pin_mode(self.pins["LEFT_MOTOR_SPEED"], Constants.PWM),
+            self.board.set_pin_mode(self.pins["RIGHT_MOTOR_SPEED"], Constants.PWM),
+
+            # digital inputs that require pull-ups enabled
+            self.board.set_pin_mode(self.pins["BUTTON_SWITCH"], Constants.INPUT, self.button_callback,
+                                    Constants.CB_TYPE_ASYNCIO),
+
+            # bumper pins
+            self.board.set_pin_mode(self.pins["LEFT_BUMPER"], Constants.INPUT, self.left_bumper_callback,
+                                    Constants.CB_TYPE_ASYNCIO),
+            self.board.set_pin_mode(self.pins["RIGHT_BUMPER"], Constants.INPUT, self.right_bumper_callback,
+                                    Constants.CB_TYPE_ASYNCIO))
+
+        await asyncio.gather(
+            # set speeds to zero
+            self.board.analog_write(self.pins["LEFT_MOTOR_SPEED"], 0),
+            self.board.analog_write(self.pins["RIGHT_MOTOR_SPEED"], 0),
+
+            # enable pull-ups
+            self.board.digital_write(self.pins["BUTTON_SWITCH"], 1),
+            self.board.digital_write(self.pins["LEFT_BUMPER"], 1),
+            self.board.digital_write(self.pins["RIGHT_BUMPER"], 1))
+
+    async def init_accel(self):
+        """
+        Start the accelerometer and, if requested, have firmata read it continuously
+        :return:
+        """
+        await self.accel.start()
+        if self.accel_continuous:
+            await self.accel.start_continuous(self.accel_axis_callback, self.accel_pl_callback,
+                                              self.accel_tap_callback)
 
-        # set speed to zero
-        await self.board.analog_write(self.pins["RIGHT_MOTOR_SPEED"], 0)
+    async def shutdown(self):
+        """
+        Stop the continuous accelerometer reads, if any, so that firmata stops sending them
+        :return:
+        """
+        if self.accel_continuous and self.accel:
+            await self.accel.stop_continuous()
 
-        # initialize digital inputs that require pull-ups enabled
-        await self.board.set_pin_mode(self.pins["BUTTON_SWITCH"], Constants.INPUT, self.button_callback,
-                                      Constants.CB_TYPE_ASYNCIO)
-        await self.board.digital_write(self.pins["BUTTON_SWITCH"], 1)
+    async def init_encoders(self):
+        """
+        Enable the wheel encoders
+        :return:
+        """
+        await self.board.encoder_config(self.pins["LEFT_ENCODER"], self.pins["RIGHT_ENCODER"],
+                                        self.encoder_callback, Constants.CB_TYPE_ASYNCIO, True)
 
-        # initialize bumper pins
-        await self.board.set_pin_mode(self.pins["LEFT_BUMPER"], Constants.INPUT,
-                                      self.left_bumper_callback, Constants.CB_TYPE_ASYNCIO)
-        await self.board.digital_write(self.pins["LEFT_BUMPER"], 1)
+    def publish_telemetry(self, message):
+        """
+        Publish a sensor report, or hold it for the next telemetry frame if batching is enabled.
+        Every bumper and button change is held. Any other held report replaces an earlier report of
+        the same info_type. Encoder counts are added together and given the time of the flush.
+        :param message: report message
+        :return:
+        """
+        if not self.telemetry_interval:
+            self.robot_message_handler.publish_payload(message, 'reporter')
+        elif message['info_type'] == 'encoders':
+            self.encoder_deltas[0] += message['left']
+            self.encoder_deltas[1] += message['right']
+        elif message['info_type'] in self.EVENT_INFO_TYPES:
+            self.telemetry_events.append(message)
+        else:
+            self.telemetry[message['info_type']] = message
 
-        await self.board.set_pin_mode(self.pins["RIGHT_BUMPER"], Constants.INPUT, self.right_bumper_callback,
-                                      Constants.CB_TYPE_ASYNCIO)
-        await self.board.digital_write(self.pins["RIGHT_BUMPER"], 1)
-        await self.accel.start()
+    def flush_telemetry(self):
+        """
+        Publish the held reports as one telemetry message and reschedule the flush.
+        Nothing is published if there is nothing new to report.
+        :return:
+        """
+        readings = self.telemetry_events + list(self.telemetry.values())
+        if self.encoder_deltas != [0, 0]:
+            readings.append({'robot_id': self.robot_id, 'info_type': 'encoders', 'left': self.encoder_deltas[0],
+                             'right': self.encoder_deltas[1], 'time': time.time()})
 
-        # enable encoders
-        await self.board.encoder_config(self.pins["LEFT_ENCODER"], self.pins["RIGHT_ENCODER"],
-                                        self.encoder_callback, Constants.CB_TYPE_ASYNCIO, True)
-        return True
+        if readings:
+            message = {'robot_id': self.robot_id, 'info_type': 'telemetry', 'readings': readings}
+            self.robot_message_handler.publish_payload(message, 'reporter')
+
+        self.telemetry_events = []
+        self.telemetry = {}
+        self.encoder_deltas = [0, 0]
+        asyncio.get_event_loop().call_later(self.telemetry_interval / 1000, self.flush_telemetry)
 
     async def motor_control(self, motor, command, speed=None):
         """
@@ -136,69 +346,59 @@ class RedBotController:
         :return:
         """
         if motor == self.LEFT_MOTOR:
-            if command == self.BRAKE:
-                await self.board.digital_write(self.pins["LEFT_MOTOR_CONTROL_1"], 1)
-                await self.board.digital_write(self.pins["LEFT_MOTOR_CONTROL_2"], 1)
-                self.encoder_count = False
-                return
-            elif command == self.FORWARD:
-                await self.board.digital_write(self.pins["LEFT_MOTOR_CONTROL_1"], 1)
-                await self.board.digital_write(self.pins["LEFT_MOTOR_CONTROL_2"], 0)
-                self.encoder_count = True
-
-            elif command == self.REVERSE:  # must be
-                await self.board.digital_write(self.pins["LEFT_MOTOR_CONTROL_1"], 0)
-                await self.board.digital_write(self.pins["LEFT_MOTOR_CONTROL_2"], 1)
-                self.encoder_count = True
-
-            else:  # default is coast
-                await self.board.digital_write(self.pins["LEFT_MOTOR_CONTROL_1"], 0)
-                await self.board.digital_write(self.pins["LEFT_MOTOR_CONTROL_2"], 0)
-                self.encoder_count = False
-                return
-            # set speed for forward and reverse if specified
-            if speed:
-                await self.board.analog_write(self.pins["LEFT_MOTOR_SPEED"], speed)
+            await self.drive(command, speed, None, None)
         else:
-            if command == self.BRAKE:
-                await self.board.digital_write(self.pins["RIGHT_MOTOR_CONTROL_1"], 1)
-                await self.board.digital_write(self.pins["RIGHT_MOTOR_CONTROL_2"], 1)
-                await self.board.analog_write(self.pins["LEFT_MOTOR_SPEED"], 0)
-                await self.board.analog_write(self.pins["RIGHT_MOTOR_SPEED"], 0)
-                self.encoder_count = False
-                return
-            elif command == self.FORWARD:
-                await self.board.digital_write(self.pins["RIGHT_MOTOR_CONTROL_1"], 1)
-                await self.board.digital_write(self.pins["RIGHT_MOTOR_CONTROL_2"], 0)
-                self.encoder_count = True
-
-            elif command == self.REVERSE:  # must be
-                await self.board.digital_write(self.pins["RIGHT_MOTOR_CONTROL_1"], 0)
-                await self.board.digital_write(self.pins["RIGHT_MOTOR_CONTROL_2"], 1)
-                self.encoder_count = True
-
-            else:  # default is coast
-                await self.board.digital_write(self.pins["RIGHT_MOTOR_CONTROL_1"], 0)
-                await self.board.digital_write(self.pins["RIGHT_MOTOR_CONTROL_2"], 0)
-                await self.board.analog_write(self.pins["LEFT_MOTOR_SPEED"], 0)
-                await self.board.analog_write(self.pins["RIGHT_MOTOR_SPEED"], 0)
-                self.encoder_count = False
-                return
-            # set speed for forward and reverse if specified
-            if speed:
-                await self.board.analog_write(self.pins["RIGHT_MOTOR_SPEED"], speed)
+            await self.drive(None, None, command, speed)
+
+    async def drive(self, left_command, left_speed, right_command, right_speed):
+        """
+        Set both motors with one call.
+        The pin levels for both motors are worked out first, and only the pins whose level has changed
+        are written. All direction writes are issued together, followed by the speed writes,
+        so the two wheels start together.
+        :param left_command: FORWARD, REVERSE, COAST, BRAKE or None to leave the left motor as it is
+        :param left_speed: left motor speed. None leaves the speed unchanged. COAST and BRAKE set it to 0.
+        :param right_command: FORWARD, REVERSE, COAST, BRAKE or None to leave the right motor as it is
+        :param right_speed: right motor speed. None leaves the speed unchanged. COAST and BRAKE set it to 0.
+        :return:
+        """
+        control_levels = {}
+        speeds = {}
+        moving = False
+
+        for side, command, speed in (('LEFT', left_command, left_speed), ('RIGHT', right_command, right_speed)):
+            if command is None:
+                continue
+            control_1, control_2 = self.motor_control_levels.get(command, self.motor_control_levels[self.COAST])
+            control_levels[self.pins[side + "_MOTOR_CONTROL_1"]] = control_1
+            control_levels[self.pins[side + "_MOTOR_CONTROL_2"]] = control_2
+
+            if command in (self.FORWARD, self.REVERSE):
+                moving = True
+                if speed is not None:
+                    speeds[self.pins[side + "_MOTOR_SPEED"]] = speed
+            else:
+                speeds[self.pins[side + "_MOTOR_SPEED"]] = 0
+
+        if not control_levels:
+            return
+
+        self.encoder_count = moving
+
+        # the pin shadow drops writes of levels the pins already have
+        await asyncio.gather(*[self.board.digital_write(pin, level) for pin, level in control_levels.items()])
+        await asyncio.gather(*[self.board.analog_write(pin, speed) for pin, speed in speeds.items()])
 
     async def get_accel_data(self):
         """
         This method polls accelerometer
         :return:
         """
-        # see if data is available, and if not come back later
-        avail = await self.accel.available()
-        if not avail:
+        # status and axis data are fetched together - if no new data is available, come back later
+        axes = await self.accel.read_burst(self.accel_axis_callback)
+        if not axes:
             return
 
-        await self.accel.read(self.accel_axis_callback)
         await self.accel.read_portrait_landscape(self.accel_pl_callback)
         await self.accel.read_tap(self.accel_tap_callback)
 
@@ -216,7 +416,7 @@ class RedBotController:
         else:
             state = 'Off'
         message = {'robot_id': self.robot_id, 'info_type': 'left_bumper', 'state': state}
-        self.robot_message_handler.publish_payload(message, 'reporter')
+        self.publish_telemetry(message)
 
     async def right_bumper_callback(self, data):
         """
@@ -232,7 +432,7 @@ class RedBotController:
         else:
             state = 'Off'
         message = {'robot_id': self.robot_id, 'info_type': 'right_bumper', 'state': state}
-        self.robot_message_handler.publish_payload(message, 'reporter')
+        self.publish_telemetry(message)
 
     async def ir1_callback(self, data):
         """
@@ -243,8 +443,7 @@ class RedBotController:
 
         # build  message
 
-        message = {'robot_id': self.robot_id, 'info_type': 'ir1', 'data': data[1]}
-        self.robot_message_handler.publish_payload(message, 'reporter')
+        self.publish_ir('ir1', data[1])
 
     async def ir2_callback(self, data):
         """
@@ -254,8 +453,7 @@ class RedBotController:
          """
         # build  message
 
-        message = {'robot_id': self.robot_id, 'info_type': 'ir2', 'data': data[1]}
-        self.robot_message_handler.publish_payload(message, 'reporter')
+        self.publish_ir('ir2', data[1])
 
     async def ir3_callback(self, data):
         """
@@ -265,8 +463,31 @@ class RedBotController:
         """
         # build  message
 
-        message = {'robot_id': self.robot_id, 'info_type': 'ir3', 'data': data[1]}
-        self.robot_message_handler.publish_payload(message, 'reporter')
+        self.publish_ir('ir3', data[1])
+
+    def publish_ir(self, info_type, value):
+        """
+        Publish an IR sensor reading unless it is within the deadband of the last published reading
+        or arrives sooner than the minimum interval allows. Suppressed readings are counted.
+        A change that is held back by the minimum interval is published by the next reading after the interval.
+        :param info_type: ir1, ir2 or ir3
+        :param value: analog reading
+        :return:
+        """
+        now = asyncio.get_event_loop().time()
+        last_value = self.ir_last_value.get(info_type)
+
+        if last_value is not None:
+            if abs(value - last_value) < self.ir_deadband[info_type] or \
+                    (now - self.ir_last_time[info_type]) * 1000 < self.ir_min_interval[info_type]:
+                self.ir_suppressed[info_type] += 1
+                return
+
+        self.ir_last_value[info_type] = value
+        self.ir_last_time[info_type] = now
+
+        message = {'robot_id': self.robot_id, 'info_type': info_type, 'data': value}
+        self.publish_telemetry(message)
 
     async def button_callback(self, data):
         """
@@ -282,7 +503,7 @@ class RedBotController:
         else:
             state = 'Off'
         message = {'robot_id': self.robot_id, 'info_type': 'push_button', 'state': state}
-        self.robot_message_handler.publish_payload(message, 'reporter')
+        self.publish_telemetry(message)
 
     async def play_tone(self, frequency, duration):
         """
@@ -303,9 +524,28 @@ class RedBotController:
 
     async def accel_axis_callback(self, data):
         """
-        This is the callback routine to retrieve the accelerometer axis data
-        :param data: [x,y,z] in raw form
-        :return: raw data, angle data and Gs
+        This is the callback routine to retrieve the accelerometer axis data.
+        Only the raw counts and the scale factor are published. Gs and angles are left for the
+        consumer to compute, unless the legacy message format was selected.
+        :param data: x,y,z raw (integers) followed by x,y,z corrected (floating point)
+        :return:
+        """
+        if self.accel_format == self.ACCEL_FORMAT_PACKED:
+            message = {'robot_id': self.robot_id, 'info_type': 'accel_packed',
+                       'data': self.ACCEL_PACKED_STRUCT.pack(data[0], data[1], data[2], self.accel.scale)}
+        elif self.accel_format == self.ACCEL_FORMAT_LEGACY:
+            message = self.legacy_accel_axis_message(data)
+        else:
+            message = {'robot_id': self.robot_id, 'info_type': 'accel_xyz', 'raw': data[0:3],
+                       'scale': self.accel.scale}
+
+        self.robot_message_handler.publish_payload(message, 'reporter')
+
+    def legacy_accel_axis_message(self, data):
+        """
+        Build the original accel_axis message, with every value formatted as a string
+        :param data: x,y,z raw (integers) followed by x,y,z corrected (floating point)
+        :return: message dictionary
         """
 
         datax = str(float("{0:.2f}".format(data[3])))
@@ -329,11 +569,9 @@ class RedBotController:
         y = str(data[1])
         z = str(data[2])
 
-        message = {'robot_id': self.robot_id, 'info_type': 'accel_axis', "xg": datax, "yg": datay, "zg": dataz,
-                   "raw_x": x, "raw_y": y, "raw_z": z,
-                   "angle_x": angle_xz, "angle_y": angle_xy, "angle_z": angle_yz}
-
-        self.robot_message_handler.publish_payload(message, 'reporter')
+        return {'robot_id': self.robot_id, 'info_type': 'accel_axis', "xg": datax, "yg": datay, "zg": dataz,
+                "raw_x": x, "raw_y": y, "raw_z": z,
+                "angle_x": angle_xz, "angle_y": angle_xy, "angle_z": angle_yz}
 
     async def accel_pl_callback(self, data):
         """
@@ -366,14 +604,16 @@ class RedBotController:
             message = {'robot_id': self.robot_id, 'info_type': 'accel_tap', 'state': 'True'}
             self.robot_message_handler.publish_payload(message, 'reporter')
 
-            await asyncio.sleep(1)
-
+            # clear the tap indication after a second without holding up accelerometer sampling
             message = {'robot_id': self.robot_id, 'info_type': 'accel_tap', 'state': 'False'}
-            self.robot_message_handler.publish_payload(message, 'reporter')
+            asyncio.get_event_loop().call_later(1, self.robot_message_handler.publish_payload, message,
+                                                'reporter')
 
     async def encoder_callback(self, data):
         """
         This method returns the number of ticks from the encoders.
+        Reports carry the time the counts were read, so that rates can be calculated from the time
+        between reports rather than from when they arrive.
         :param data: data[0] = left encoder data, data[1] = right encoder data.
         :return:
         """
@@ -381,8 +621,9 @@ class RedBotController:
             pass
         else:
             if self.encoder_count:
-                message = {'robot_id': self.robot_id, 'info_type': 'encoders', 'left': data[0], 'right': data[1]}
-                self.robot_message_handler.publish_payload(message, 'reporter')
+                message = {'robot_id': self.robot_id, 'info_type': 'encoders', 'left': data[0], 'right': data[1],
+                           'time': time.time()}
+                self.publish_telemetry(message)
 
 
 if __name__ == "__main__":
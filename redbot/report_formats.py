@@ -0,0 +1,25 @@
+"""
+Copyright (c) 2016 Alan Yorinks All rights reserved.
+
+This program is free software; you can redistribute it and/or
+modify it under the terms of the GNU  General Public
+License as published by the Free Software Foundation; either
+version 3 of the License, or (at your option) any later version.
+
+This library is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public
+License along with this library; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+# Binary layouts of robot reports, shared by the robot controller that packs them and the GUIs that unpack them.
+# This module has no dependencies so that GUIs can import it without pymata_aio.
+
+import struct
+
+# packed accelerometer payload: x, y, z raw counts followed by the scale factor, little endian
+ACCEL_PACKED_STRUCT = struct.Struct('<hhhB')
@@ -18,26 +18,79 @@ License along with this library; if not, write to the Free Software
 Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
 """
 
+import importlib
+import os
+import re
 import signal
 import sys
+import time
 import argparse
 import asyncio
 
 import umsgpack
 import zmq
 from pymata_aio.pymata_core import PymataCore
-from xideco.xidekit.xidekit import XideKit
 
 # noinspection PyUnresolvedReferences,PyUnresolvedReferences
 from redbot_controller import RedBotController
+# noinspection PyUnresolvedReferences
+from command_mailbox import CommandMailbox
+
+try:
+    # noinspection PyUnresolvedReferences
+    from router.local_endpoints import LocalXideKit
+    # noinspection PyUnresolvedReferences
+    from router.xibrt import ipc_endpoints
+except ImportError:
+    # run as a script - the package root is not on the module path
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+    # noinspection PyUnresolvedReferences
+    from router.local_endpoints import LocalXideKit
+    # noinspection PyUnresolvedReferences
+    from router.xibrt import ipc_endpoints
+
+
+class RobotSession:
+    """
+    The per robot state managed by XIRB - the board, its controller, its command queue and statistics
+    """
+
+    def __init__(self, robot_id, board, rb_control):
+        """
+        :param robot_id: robot id
+        :param board: pymata_core instance
+        :param rb_control: RedBotController instance
+        """
+        self.robot_id = robot_id
+        self.board = board
+        self.rb_control = rb_control
+
+        # incoming messages waiting to be dispatched - superseded motion commands are dropped
+        self.command_queue = CommandMailbox()
+
+        # command latency statistics
+        self.command_count = 0
+        self.command_latency_total = 0
+        self.command_latency_max = 0
 
 
 # noinspection PyPep8Naming,PyPep8,PyUnresolvedReferences
-class XIRB(XideKit):
+class XIRB(LocalXideKit):
     """
     This class is the RedBot controller class
     """
 
+    # left and right motor commands for each move_robot direction. None leaves a motor as it is.
+    MOTIONS = {'forward': (RedBotController.FORWARD, RedBotController.FORWARD),
+               'reverse': (RedBotController.REVERSE, RedBotController.REVERSE),
+               'spin_left': (RedBotController.FORWARD, RedBotController.REVERSE),
+               'spin_right': (RedBotController.REVERSE, RedBotController.FORWARD),
+               'left': (RedBotController.FORWARD, None),
+               'right': (None, RedBotController.FORWARD)}
+
+    # motor command for each stop_type
+    STOPS = {'brake': RedBotController.BRAKE, 'coast': RedBotController.COAST}
+
     def __init__(self, **kwargs):
         """
         This method sets up all provided parameters. The default values assume that this class will be run
@@ -46,7 +99,19 @@ class XIRB(XideKit):
         Start xirt before invoking this class.
         :param kwargs: see prop_defaults below
 
-        It creates an instance of pymata_core and an instance of the redbot controller
+        robots is a list of dictionaries, one per robot, each with a robot_id and the arduino_com_port,
+        arduino_ip_address, arduino_ip_port and handshake entries used to connect to that robot's board.
+        Missing entries take the values of the single robot properties. If robots is not provided,
+        the single robot properties describe the only robot.
+
+        router_endpoints is an optional (publish to router, subscribe to router) pair of ipc:// or inproc://
+        endpoints used instead of TCP. shared_context is the zmq context to use, which must be the router's for
+        inproc://.
+
+        plugins is a list of module names. Each module's register function is called with this XIRB instance
+        before the boards are started, and may add or replace command handlers with register_command_handler.
+
+        It creates an instance of pymata_core and an instance of the redbot controller for each robot
         """
 
         print('\nXiBot RedBot Controller - xirb')
@@ -54,7 +119,11 @@ class XIRB(XideKit):
             "subscribed": None, "robot_id": '1',
             "router_ip_address": None, "subscriber_port": '43125', "publisher_port": '43124',
             "arduino_com_port": None, "arduino_wait_time": 2, "arduino_ip_address": None,
-            "arduino_ip_port": 2000, "handshake": "*HELLO*", "sleep_tune": 0.0001, "log_output": False
+            "arduino_ip_port": 2000, "handshake": "*HELLO*", "sleep_tune": 0.0001, "log_output": False,
+            "report_interval": 0, "accel_sample_rate": 10, "accel_continuous": False,
+            "accel_format": RedBotController.ACCEL_FORMAT_NUMERIC, "telemetry_interval": 0,
+            "ir_deadband": 0, "ir_min_interval": 0, "robots": None,
+            "fast_start": False, "router_endpoints": None, "shared_context": None, "plugins": None
         }
 
         # setup all of the properties
@@ -62,182 +131,389 @@ class XIRB(XideKit):
             setattr(self, prop, kwargs.get(prop, default))
 
         # initialize the XideKit parent class
-        super(XIRB, self).__init__(self.router_ip_address, self.subscriber_port, self.publisher_port)
+        super(XIRB, self).__init__(self.router_ip_address, self.subscriber_port, self.publisher_port,
+                                   self.router_endpoints, self.shared_context)
+
+        if self.robots is None:
+            self.robots = [{'robot_id': self.robot_id}]
+
+        self.register_builtin_commands()
+        for plugin in self.plugins or []:
+            importlib.import_module(plugin).register(self)
+
+        self.loop = asyncio.get_event_loop()
+
+        # robot sessions keyed by the topic used to command the robot
+        self.sessions = {}
+
+        for robot in self.robots:
+            robot_id = str(robot['robot_id'])
+
+            # instantiate pymata_core
+            board = PymataCore(self.arduino_wait_time, self.sleep_tune, self.log_output,
+                               robot.get('arduino_com_port', self.arduino_com_port),
+                               robot.get('arduino_ip_address', self.arduino_ip_address),
+                               robot.get('arduino_ip_port', self.arduino_ip_port),
+                               robot.get('handshake', self.handshake))
+
+            # instantiate the low level controller
+            rb_control = RedBotController(board, robot_id=robot_id, robot_message_handler=self,
+                                          accel_continuous=self.accel_continuous,
+                                          accel_format=self.accel_format,
+                                          telemetry_interval=self.telemetry_interval,
+                                          ir_deadband=self.ir_deadband, ir_min_interval=self.ir_min_interval,
+                                          fast_start=self.fast_start)
+
+            self.sessions['robot' + robot_id] = RobotSession(robot_id, board, rb_control)
 
         # if not topics are provided
         if self.subscribed is None:
-            self.subscribed = ['robot' + str(self.robot_id)]
+            self.subscribed = list(self.sessions)
 
         # if not the default topic, the topics are passed in as a list
         for x in self.subscribed:
             self.set_subscriber_topic(x)
 
-        # instatiate pymata_core
-
-        self.board = PymataCore(self.arduino_wait_time, self.sleep_tune, self.log_output,
-                                self.arduino_com_port, self.arduino_ip_address,
-                                self.arduino_ip_port, self.handshake)
-
-        self.loop = asyncio.get_event_loop()
-
-        # instantiate the low level controller
-        self.rb_control = RedBotController(self.board, robot_id=self.robot_id, robot_message_handler=self)
+        # run the controllers - all boards are brought up together, including the wait for each Arduino to reset
+        self.loop.run_until_complete(asyncio.gather(*[session.rb_control.init_red_board()
+                                                      for session in self.sessions.values()]))
 
-        # run the controller
-        self.loop.run_until_complete(self.rb_control.init_red_board())
+        for session in self.sessions.values():
+            times = session.rb_control.startup_times
+            print('Robot {0} ready in {1:.0f} ms - board: {2:.0f} ms  pins: {3:.0f} ms  accelerometer: {4:.0f} ms  '
+                  'encoders: {5:.0f} ms'.format(session.robot_id, times['total'] * 1000, times['board'] * 1000,
+                                                times['pins'] * 1000, times['accelerometer'] * 1000,
+                                                times['encoders'] * 1000))
 
     def receive_loop(self):
         """
         This is the receive loop for zmq messages. It is written as "non-asyncio" so that it can be called
         directly without having to worry about the asyncio event loop.
+
+        The subscriber socket is registered with the event loop, so the loop sleeps until a message
+        arrives instead of polling for one.
         :return: Never Returns
         """
+        self.loop.add_reader(self.subscriber.getsockopt(zmq.FD), self.drain_subscriber)
 
-        while True:
-            # retrieve the next XiBot message
-            next_message = self.loop.run_until_complete(self.get_next_message())
-
-            # Process a message when returned
-            if next_message:
-                self.loop.run_until_complete(self.incoming_message_processing(next_message[0], next_message[1]))
+        # messages may have arrived before the reader was registered
+        self.drain_subscriber()
 
-            # retrieve the accelerometer data within this loop
-            self.loop.run_until_complete(self.rb_control.get_accel_data())
+        if self.report_interval:
+            self.loop.call_later(self.report_interval, self.periodic_report)
 
-    async def get_next_message(self):
+        try:
+            # each robot's accelerometer sampling and command dispatch run as their own tasks
+            for session in self.sessions.values():
+                self.loop.create_task(self.sample_accelerometer(session))
+            self.loop.run_until_complete(asyncio.gather(*[self.dispatch_commands(session)
+                                                          for session in self.sessions.values()]))
+        except KeyboardInterrupt:
+            self.report_statistics()
+            self.loop.run_until_complete(asyncio.gather(*[session.rb_control.shutdown()
+                                                          for session in self.sessions.values()]))
+            self.loop.remove_reader(self.subscriber.getsockopt(zmq.FD))
+            self.publisher.close()
+            self.subscriber.close()
+            # a shared context belongs to whoever created it
+            if not self.shared_context:
+                self.context.term()
+            sys.exit(0)
+
+    def drain_subscriber(self):
         """
-        This method uses an async future to retrieve the next message from the network.
-        :return: If not message is available, None is returned, else the message is returned as a list containing
-        the topic and payload.
+        This method is called by the event loop when the subscriber socket becomes readable.
+        The zmq file descriptor is edge triggered, so every pending message must be read before returning.
+        Each message is queued with its arrival time for the command dispatcher of the robot it is addressed to.
+        :return:
         """
-        # create an asyncio Future
-        future = asyncio.Future()
-
-        try:
-            # get the next available message
+        while self.subscriber.getsockopt(zmq.EVENTS) & zmq.POLLIN:
             data = self.subscriber.recv_multipart(zmq.NOBLOCK)
 
+            # a malformed message is reported and skipped, so that the messages behind it are still read
+            if len(data) != 2:
+                print('ignoring message with {0} frames'.format(len(data)))
+                continue
+
             # get the topic and unpack the payload
-            topic = data[0].decode()
-            payload = umsgpack.unpackb(data[1])
+            try:
+                topic = data[0].decode()
+                payload = umsgpack.unpackb(data[1])
+            except (UnicodeDecodeError, umsgpack.UnpackException) as e:
+                print('ignoring message that cannot be unpacked: {0!r}'.format(e))
+                continue
+
+            if not isinstance(payload, dict):
+                print('ignoring message for topic {0} that is not a command'.format(topic))
+                continue
+
+            session = self.session_for_topic(topic)
+            if session:
+                session.command_queue.put(topic, payload, time.perf_counter())
+            else:
+                print('no robot for topic ' + topic)
+
+    def session_for_topic(self, topic):
+        """
+        Find the robot a message is addressed to. When there is only one robot, all messages are for it.
+        :param topic: message topic
+        :return: RobotSession or None
+        """
+        if len(self.sessions) == 1:
+            return next(iter(self.sessions.values()))
+        return self.sessions.get(topic)
+
+    async def dispatch_commands(self, session):
+        """
+        Wait for queued messages and process them. A stop is processed ahead of other waiting messages,
+        and a motion command that has been replaced by a newer one is never processed.
+        A command that raises an exception is reported and does not stop the dispatcher.
+        The time from message arrival until the motor writes complete is recorded for each command.
+        :param session: the robot whose commands are dispatched
+        :return: Never Returns
+        """
+        while True:
+            topic, payload, arrival_time = await session.command_queue.get()
+
+            # a command that fails is reported and dropped, so that the robot's later commands still run
+            try:
+                await self.incoming_message_processing(topic, payload)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print('command {0} for topic {1} failed: {2!r}'.format(payload.get('command'), topic, e))
+                continue
+
+            latency = time.perf_counter() - arrival_time
+            session.command_count += 1
+            session.command_latency_total += latency
+            if latency > session.command_latency_max:
+                session.command_latency_max = latency
+
+    async def sample_accelerometer(self, session):
+        """
+        Retrieve accelerometer data at accel_sample_rate samples per second.
+        The time spent reading the device is subtracted from the sample period.
+        A sample rate of 0 disables sampling. When firmata is reading the accelerometer continuously,
+        no sampling is needed.
+        :param session: the robot whose accelerometer is sampled
+        :return: Never Returns
+        """
+        if not self.accel_sample_rate or self.accel_continuous:
+            return
+
+        period = 1 / self.accel_sample_rate
+        while True:
+            start_time = self.loop.time()
+            try:
+                await session.rb_control.get_accel_data()
+            except asyncio.TimeoutError:
+                # the i2c reply never arrived - drop this sample
+                pass
+            await asyncio.sleep(max(0, period - (self.loop.time() - start_time)))
+
+    def periodic_report(self):
+        """
+        Print the statistics and reschedule the report
+        :return:
+        """
+        self.report_statistics()
+        self.loop.call_later(self.report_interval, self.periodic_report)
+
+    def report_statistics(self):
+        """
+        Print the command latency, command queue, pin write and IR filter statistics for each robot
+        :return:
+        """
+        for session in self.sessions.values():
+            if len(self.sessions) > 1:
+                print('Robot {0}'.format(session.robot_id))
+
+            if session.command_count:
+                average = session.command_latency_total / session.command_count
+            else:
+                average = 0
+            print('Commands: {0}  Latency avg: {1:.2f} ms  max: {2:.2f} ms'.format(session.command_count,
+                                                                                   average * 1000,
+                                                                                   session.command_latency_max * 1000))
+
+            command_queue = session.command_queue
+            print('Commands dropped as superseded: {0}  Max queue depth: {1}'.format(command_queue.dropped,
+                                                                                     command_queue.max_depth))
+
+            shadow = session.rb_control.board
+            print('Pin writes sent: {0}  dropped as unchanged: {1}'.format(shadow.misses, shadow.hits))
+
+            suppressed = session.rb_control.ir_suppressed
+            print('IR readings suppressed: ir1: {0}  ir2: {1}  ir3: {2}'.format(suppressed['ir1'], suppressed['ir2'],
+                                                                                suppressed['ir3']))
+
+    def register_builtin_commands(self):
+        """
+        Create the command handler tables with the commands sent by the GUI
+        :return:
+        """
+        # handlers for every topic, keyed by command
+        self.command_handlers = {}
 
-            # place them into a list
-            message = [topic, payload]
+        # handlers for one topic, keyed by (topic, command)
+        self.topic_command_handlers = {}
 
-            # place the message in the future result
-            future.set_result(message)
+        self.register_command_handler('move_robot', self.do_motion)
+        self.register_command_handler('stop', self.process_stop)
+        self.register_command_handler('play_tone', self.play_tone)
+        self.register_command_handler('set_led', self.set_led)
 
-            # wait until the future reports that it is complete and then return the topic, payload list
-            while not future.done():
-                await asyncio.sleep(.01)
-            return future.result()
-        except zmq.error.Again:
-            # if no message is available, zmq throws the Again exception, so just return None
-            return None
+    def register_command_handler(self, command, handler, topic=None):
+        """
+        Route a command to a handler. A handler registered for a topic is used instead of one registered for
+        every topic. Registering a command again replaces its handler.
+        :param command: command name
+        :param handler: coroutine function called with the robot's RedBotController and the payload
+        :param topic: topic the handler is for - e.g. robot2. None = every topic
+        :return:
+        """
+        if topic is None:
+            self.command_handlers[command] = handler
+        else:
+            self.topic_command_handlers[(topic, command)] = handler
 
     async def incoming_message_processing(self, topic, payload):
         """
-        This is the incoming message processor. It dereferences the command field from the payload and dispatches
-        the appropriate method to handle the command.
+        This is the incoming message processor. It dispatches the message to the handler of its command.
         :param topic: topic string
         :param payload: message data
         :return:
         """
+        rb_control = self.session_for_topic(topic).rb_control
+        await self.dispatch_command(rb_control, topic, payload)
 
-        # extract the command from the payload
+    async def dispatch_command(self, rb_control, topic, payload):
+        """
+        Look up the handler for a command and run it
+        :param rb_control: RedBotController of the robot the command is for
+        :param topic: topic string
+        :param payload: message data
+        :return:
+        """
         command = payload['command']
 
-        if command == 'move_robot':
-            await self.do_motion(payload['direction'], payload['speed'])
-        elif command == 'stop':
-            await self.process_stop(payload['stop_type'])
-        elif command == 'play_tone':
-            await self.rb_control.play_tone(payload['freq'], payload['duration'])
-        elif command == 'set_led':
-            await self.rb_control.set_led(payload['state'])
+        handler = None
+        if self.topic_command_handlers:
+            handler = self.topic_command_handlers.get((topic, command))
+        if handler is None:
+            handler = self.command_handlers.get(command)
+
+        if handler:
+            await handler(rb_control, payload)
         else:
             print('unknown command')
-        asyncio.sleep(.01)
 
-    async def do_motion(self, operation, speed):
+    async def do_motion(self, rbc, payload):
         """
         Select motors to run either forward or reverse with the specified motor speed.
-        :param operation: forward or reverse direction
-        :param speed: motor speed
+        Both motors are set with a single drive call.
+        :param rbc: RedBotController of the robot to move
+        :param payload: move_robot message with the direction and motor speed
         :return:
         """
-
-        if operation == 'forward':
-            operation = self.rb_control.FORWARD
-            await (self.rb_control.motor_control(self.rb_control.LEFT_MOTOR,
-                                                 operation, int(speed)))
-            await(self.rb_control.motor_control(self.rb_control.RIGHT_MOTOR,
-                                                operation, int(speed)))
-
-        elif operation == 'reverse':
-            operation = self.rb_control.REVERSE
-            await(self.rb_control.motor_control(self.rb_control.LEFT_MOTOR,
-                                                operation, int(speed)))
-            await(self.rb_control.motor_control(self.rb_control.RIGHT_MOTOR,
-                                                operation, int(speed)))
-        elif operation == 'spin_left':
-            await(self.rb_control.motor_control(self.rb_control.LEFT_MOTOR,
-                                                self.rb_control.FORWARD, int(speed)))
-            await(self.rb_control.motor_control(self.rb_control.RIGHT_MOTOR,
-                                                self.rb_control.REVERSE, int(speed)))
-        elif operation == 'spin_right':
-            await(self.rb_control.motor_control(self.rb_control.RIGHT_MOTOR,
-                                                self.rb_control.FORWARD, int(speed)))
-            await(self.rb_control.motor_control(self.rb_control.LEFT_MOTOR,
-                                                self.rb_control.REVERSE, int(speed)))
-        elif operation == 'left':
-            await(self.rb_control.motor_control(self.rb_control.LEFT_MOTOR,
-                                                self.rb_control.FORWARD, int(speed)))
-        elif operation == 'right':
-            await(self.rb_control.motor_control(self.rb_control.RIGHT_MOTOR,
-                                                self.rb_control.FORWARD, int(speed)))
-        else:
+        commands = self.MOTIONS.get(payload['direction'])
+        if commands is None:
             print('unknown motion operation')
             return
 
-    async def process_stop(self, stop_type):
+        speed = int(payload['speed'])
+        left_command, right_command = commands
+        await rbc.drive(left_command, None if left_command is None else speed,
+                        right_command, None if right_command is None else speed)
+
+    async def process_stop(self, rbc, payload):
         """
         Stop the motors.
-        :param stop_type: Use either braking or coasting
+        :param rbc: RedBotController of the robot to stop
+        :param payload: stop message with the stop_type - brake or coast
         :return:
         """
-        if stop_type == 'brake':
-            await(self.rb_control.motor_control(self.rb_control.RIGHT_MOTOR,
-                                                self.rb_control.BRAKE, 0))
-            await(self.rb_control.motor_control(self.rb_control.LEFT_MOTOR,
-                                                self.rb_control.BRAKE, 0))
-        elif stop_type == 'coast':
-            await(self.rb_control.motor_control(self.rb_control.RIGHT_MOTOR,
-                                                self.rb_control.COAST, 0))
-            await(self.rb_control.motor_control(self.rb_control.LEFT_MOTOR,
-                                                self.rb_control.COAST, 0))
+        command = self.STOPS.get(payload['stop_type'])
+        if command is not None:
+            await rbc.drive(command, 0, command, 0)
 
+    # noinspection PyMethodMayBeStatic
+    async def play_tone(self, rbc, payload):
+        await rbc.play_tone(payload['freq'], payload['duration'])
 
-def redbot_controller():
+    # noinspection PyMethodMayBeStatic
+    async def set_led(self, rbc, payload):
+        await rbc.set_led(payload['state'])
+
+
+def parse_robots(robots):
     """
-    Main function for arduino bridge
-    :return:
+    Convert the -m command line option into the XIRB robots list
+    :param robots: comma separated id=connection entries
+    :return: list of robot dictionaries
     """
-    # noinspection PyShadowingNames
+    robot_list = []
+    for entry in robots.split(','):
+        robot_id, connection = entry.split('=', 1)
+        robot = {'robot_id': robot_id.strip()}
+        connection = connection.strip()
+
+        wifly = re.match(r'^(\d+\.\d+\.\d+\.\d+)(?::(\d+))?$', connection)
+        if wifly:
+            robot['arduino_ip_address'] = wifly.group(1)
+            if wifly.group(2):
+                robot['arduino_ip_port'] = int(wifly.group(2))
+        else:
+            robot['arduino_com_port'] = connection
+        robot_list.append(robot)
+    return robot_list
+
 
+def get_options():
+    """
+    Parse the command line
+    :return: XIRB keyword options
+    """
     parser = argparse.ArgumentParser()
     parser.add_argument("-a", dest="w_ip_addr", default="None", help="WiFly IP Address")
     parser.add_argument("-b", dest="robot_id", default="1", help="Values of 1-3")
+    parser.add_argument("-c", dest="accel_continuous", action="store_true",
+                        help="Have firmata read the accelerometer continuously")
+    parser.add_argument("-d", dest="ir_deadband", default="0",
+                        help="IR change needed before publishing. One value or 3 comma separated values")
+    parser.add_argument("-e", dest="arduino_wait_time", default="2",
+                        help="Seconds to wait for the Arduino to reset. WiFly connected boards do not reset")
+    parser.add_argument("-f", dest="accel_format", default="numeric", choices=["numeric", "packed", "legacy"],
+                        help="Accelerometer message format. legacy = string values for older GUIs")
+    parser.add_argument("-g", dest="plugins", default="None",
+                        help="Comma separated plugin modules that register command handlers")
+    parser.add_argument("-i", dest="ir_min_interval", default="0",
+                        help="Minimum ms between IR publishes. One value or 3 comma separated values")
     parser.add_argument("-k", dest="handshake", default="*HELLO*", help="WiFly Handshake string")
+    parser.add_argument("-l", dest="report_interval", default="0",
+                        help="Command latency report interval in seconds. 0 = report on exit only")
+    parser.add_argument("-m", dest="robots", default="None",
+                        help="Control several robots - comma separated id=connection entries. A connection is a "
+                             "COM port or a WiFly IP address with an optional :port. "
+                             "e.g. 1=/dev/ttyACM0,2=10.0.0.7:2000")
     parser.add_argument("-p", dest="comport", default="None", help="Arduino COM port - e.g. /dev/ttyACMO or COM3")
     parser.add_argument('-r', dest='router_ip_address', default='None', help='Router IP Address')
+    parser.add_argument('-s', dest='accel_sample_rate', default='10',
+                        help='Accelerometer samples per second. 0 = disabled')
+    parser.add_argument('-t', dest='telemetry_interval', default='0',
+                        help='Batch sensor reports into one message every N ms. 0 = publish each report')
+    parser.add_argument('-u', dest='ipc_path', default='None',
+                        help='Use the router ipc endpoints with this path prefix instead of TCP - e.g. /tmp/xibot')
     parser.add_argument('-w', dest='w_ip_port', default='2000', help='WiFly IP Port')
+    parser.add_argument('-x', dest='fast_start', action='store_true',
+                        help='Fast start - assume accelerometer reset values instead of reading them')
 
     args = parser.parse_args()
     kw_options = {}
 
     if args.w_ip_addr != 'None':
-        kw_options['arduino_ip_port'] = args.w_ip_addr
+        kw_options['arduino_ip_address'] = args.w_ip_addr
 
     if args.robot_id != '1':
         kw_options['robot_id'] = args.robot_id
@@ -251,10 +527,60 @@ def redbot_controller():
     if args.router_ip_address != "None":
         kw_options['router_ip_address'] = args.router_ip_address
 
+    if args.ipc_path != 'None':
+        kw_options['router_endpoints'] = ipc_endpoints(args.ipc_path)
+
     if args.w_ip_port != '2000':
         kw_options['arduino_ip_port'] = args.w_ip_port
 
-    my_robot = XIRB(**kw_options)
+    if args.robots != 'None':
+        kw_options['robots'] = parse_robots(args.robots)
+
+    if args.arduino_wait_time != '2':
+        kw_options['arduino_wait_time'] = float(args.arduino_wait_time)
+
+    if args.fast_start:
+        kw_options['fast_start'] = True
+
+    if args.accel_continuous:
+        kw_options['accel_continuous'] = True
+
+    if args.accel_format != 'numeric':
+        kw_options['accel_format'] = args.accel_format
+
+    if args.accel_sample_rate != '10':
+        kw_options['accel_sample_rate'] = float(args.accel_sample_rate)
+
+    if args.ir_deadband != '0':
+        kw_options['ir_deadband'] = [float(x) for x in args.ir_deadband.split(',')]
+        if len(kw_options['ir_deadband']) not in (1, 3):
+            parser.error('-d needs 1 or 3 comma separated values')
+
+    if args.ir_min_interval != '0':
+        kw_options['ir_min_interval'] = [float(x) for x in args.ir_min_interval.split(',')]
+        if len(kw_options['ir_min_interval']) not in (1, 3):
+            parser.error('-i needs 1 or 3 comma separated values')
+
+    if args.telemetry_interval != '0':
+        kw_options['telemetry_interval'] = float(args.telemetry_interval)
+
+    if args.report_interval != '0':
+        kw_options['report_interval'] = float(args.report_interval)
+
+    if args.plugins != 'None':
+        kw_options['plugins'] = [plugin.strip() for plugin in args.plugins.split(',')]
+
+    return kw_options
+
+
+def redbot_controller():
+    """
+    Main function for arduino bridge
+    :return:
+    """
+    # noinspection PyShadowingNames
+
+    my_robot = XIRB(**get_options())
     my_robot.receive_loop()
 
     # signal handler function called when Control-C occurs
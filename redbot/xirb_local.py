@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+
+"""
+Copyright (c) 2016 Alan Yorinks All rights reserved.
+
+This program is free software; you can redistribute it and/or
+modify it under the terms of the GNU  General Public
+License as published by the Free Software Foundation; either
+version 3 of the License, or (at your option) any later version.
+
+This library is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public
+License along with this library; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+import os
+import sys
+import threading
+
+import zmq
+
+# noinspection PyUnresolvedReferences
+from xirb import XIRB, get_options
+
+try:
+    # noinspection PyUnresolvedReferences
+    from router.xibrt import XidecoRouter
+except ImportError:
+    # run as a script - the package root is not on the module path
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+    # noinspection PyUnresolvedReferences
+    from router.xibrt import XidecoRouter
+
+# endpoints used between the router and the robot controller within this process
+INPROC_ENDPOINTS = ('inproc://xibrt-pub', 'inproc://xibrt-sub')
+
+
+def xirb_local():
+    """
+    Run the router and the robot controller in one process. They share a zmq context and exchange messages
+    over inproc:// endpoints instead of TCP. The router's TCP ports remain available to GUIs on other computers.
+    Accepts the same options as xirb.
+    :return:
+    """
+    kw_options = get_options()
+
+    context = zmq.Context()
+
+    # the endpoints are bound before the robot controller connects to them
+    xideco_router = XidecoRouter(local_endpoints=INPROC_ENDPOINTS, context=context)
+    router = threading.Thread(target=xideco_router.route, daemon=True)
+    router.start()
+
+    kw_options['router_endpoints'] = INPROC_ENDPOINTS
+    kw_options['shared_context'] = context
+
+    my_robot = XIRB(**kw_options)
+    my_robot.receive_loop()
+
+
+if __name__ == "__main__":
+
+    try:
+        xirb_local()
+    except KeyboardInterrupt:
+        sys.exit(0)
@@ -0,0 +1,78 @@
+"""
+Copyright (c) 2016 Alan Yorinks All right reserved.
+
+This program is free software; you can redistribute it and/or
+modify it under the terms of the GNU General Public
+License as published by the Free Software Foundation; either
+version 3 of the License, or (at your option) any later version.
+
+This library is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public
+License along with this library; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+import zmq
+from xideco.xidekit.xidekit import XideKit
+
+
+class LocalXideKit(XideKit):
+    """
+    This class is a XideKit that can also reach the router over its local ipc:// or inproc:// endpoints,
+    and that can set options on its sockets before they connect.
+    """
+
+    def __init__(self, router_ip_address=None, subscriber_port='43125', publisher_port='43124',
+                 router_endpoints=None, context=None, subscriber_options=None, publisher_options=None):
+        """
+        :param router_ip_address: Xideco Router IP Address - if not specified, it will be set to the local computer
+        :param subscriber_port: Xideco router subscriber port. This must match that of the Xideco router
+        :param publisher_port: Xideco router publisher port. This must match that of the Xideco router
+        :param router_endpoints: Optional (publish to router, subscribe to router) ipc:// or inproc:// endpoints
+                                 used instead of TCP
+        :param context: zmq context to use. Required for inproc:// endpoints - it must be the router's context.
+        :param subscriber_options: Optional dictionary of zmq socket options for the subscriber, e.g. {zmq.RCVHWM: 0}
+        :param publisher_options: Optional dictionary of zmq socket options for the publisher
+        :return:
+        """
+        # with local endpoints, no router address is needed - avoid looking one up
+        if router_endpoints and not router_ip_address:
+            router_ip_address = '127.0.0.1'
+        super().__init__(router_ip_address, subscriber_port, publisher_port)
+
+        if router_endpoints or context or subscriber_options or publisher_options:
+            self.reconnect(router_endpoints, context, subscriber_options, publisher_options)
+
+    def reconnect(self, router_endpoints=None, context=None, subscriber_options=None, publisher_options=None):
+        """
+        Replace the TCP connections made by XideKit. Socket options such as high water marks only apply to
+        connections made after they are set.
+        :param router_endpoints: (publish to router, subscribe to router) endpoints. None = the router's TCP ports
+        :param context: zmq context to use instead of the one XideKit created
+        :param subscriber_options: dictionary of zmq socket options for the subscriber
+        :param publisher_options: dictionary of zmq socket options for the publisher
+        :return:
+        """
+        self.subscriber.close()
+        self.publisher.close()
+        if context:
+            self.context.term()
+            self.context = context
+
+        if not router_endpoints:
+            router_endpoints = ('tcp://' + self.router_ip_address + ':' + self.publisher_port,
+                                'tcp://' + self.router_ip_address + ':' + self.subscriber_port)
+
+        self.publisher = self.context.socket(zmq.PUB)
+        for option, value in (publisher_options or {}).items():
+            self.publisher.setsockopt(option, value)
+        self.publisher.connect(router_endpoints[0])
+
+        self.subscriber = self.context.socket(zmq.SUB)
+        for option, value in (subscriber_options or {}).items():
+            self.subscriber.setsockopt(option, value)
+        self.subscriber.connect(router_endpoints[1])
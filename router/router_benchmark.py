@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Copyright (c) 2016 Alan Yorinks All right reserved.
+
+This program is free software; you can redistribute it and/or
+modify it under the terms of the GNU General Public
+License as published by the Free Software Foundation; either
+version 3 of the License, or (at your option) any later version.
+
+This library is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public
+License along with this library; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+import argparse
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+
+import umsgpack
+import zmq
+
+
+def publisher(router_ip_address, topic, messages, start):
+    """
+    Publish messages to the router as fast as possible
+    :param router_ip_address: router IP address
+    :param topic: topic to publish
+    :param messages: number of messages
+    :param start: event set when all subscribers are connected
+    :return:
+    """
+    context = zmq.Context()
+    publish = context.socket(zmq.PUB)
+    publish.setsockopt(zmq.SNDHWM, 0)
+    publish.connect('tcp://' + router_ip_address + ':43124')
+
+    payload = umsgpack.packb({'robot_id': topic[-1], 'info_type': 'accel_xyz', 'raw': [12, -340, 1024], 'scale': 2})
+    topic = topic.encode()
+
+    start.wait()
+    for _ in range(messages):
+        publish.send_multipart([topic, payload])
+
+    publish.close(linger=-1)
+    context.term()
+
+
+def subscriber(router_ip_address, expected, ready, results):
+    """
+    Count the messages received from the router
+    :param router_ip_address: router IP address
+    :param expected: number of messages that will be published
+    :param ready: queue used to report that the subscriber is connected
+    :param results: queue used to report the number of messages received and the time the last one arrived
+    :return:
+    """
+    context = zmq.Context()
+    subscribe = context.socket(zmq.SUB)
+    subscribe.setsockopt(zmq.RCVHWM, 0)
+    subscribe.connect('tcp://' + router_ip_address + ':43125')
+    subscribe.setsockopt(zmq.SUBSCRIBE, b'')
+
+    # wait for the subscription to reach the router
+    time.sleep(1)
+    ready.put(True)
+
+    received = 0
+    last_time = time.time()
+    while received < expected and subscribe.poll(2000):
+        subscribe.recv_multipart()
+        received += 1
+        last_time = time.time()
+
+    results.put((received, last_time))
+    subscribe.close()
+    context.term()
+
+
+def run(publishers, subscribers, messages, high_water_mark, statistics_enabled):
+    """
+    Start a router and measure how long it takes to forward the messages of all publishers to all subscribers
+    :param publishers: number of publisher processes
+    :param subscribers: number of subscriber processes
+    :param messages: messages sent by each publisher
+    :param high_water_mark: router high water mark
+    :param statistics_enabled: let the router count messages per topic
+    :return: messages forwarded per second and the fraction of messages delivered
+    """
+    router_ip_address = '127.0.0.1'
+    command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'xibrt.py'),
+               '-b', router_ip_address, '-m', str(high_water_mark)]
+    if not statistics_enabled:
+        command.append('-n')
+    router = subprocess.Popen(command, stdout=subprocess.PIPE, universal_newlines=True)
+
+    # wait for the router to start
+    for line in router.stdout:
+        if line.startswith('Using router IP address'):
+            break
+
+    start = multiprocessing.Event()
+    ready = multiprocessing.Queue()
+    results = multiprocessing.Queue()
+
+    expected = publishers * messages
+    receivers = [multiprocessing.Process(target=subscriber, args=(router_ip_address, expected, ready, results))
+                 for _ in range(subscribers)]
+    senders = [multiprocessing.Process(target=publisher,
+                                       args=(router_ip_address, 'robot' + str(i + 1), messages, start))
+               for i in range(publishers)]
+
+    for process in receivers + senders:
+        process.start()
+    for _ in receivers:
+        ready.get()
+
+    # give the publishers time to connect
+    time.sleep(.5)
+    start_time = time.time()
+    start.set()
+
+    outcomes = [results.get() for _ in receivers]
+    for process in receivers + senders:
+        process.join()
+
+    router.terminate()
+    router.wait()
+
+    elapsed = max(last_time for _, last_time in outcomes) - start_time
+    delivered = sum(received for received, _ in outcomes)
+    return delivered / elapsed, delivered / (expected * subscribers)
+
+
+def router_benchmark():
+    """
+    Measure the router's forwarding rate. Every message passes through the router's single proxy loop,
+    so this is the rate one router can sustain for all of its robots and GUIs.
+    :return:
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-m', dest='messages', default='50000', help='Messages sent by each publisher')
+    parser.add_argument('-p', dest='publishers', default='4', help='Number of publishers')
+    parser.add_argument('-s', dest='subscribers', default='4', help='Number of subscribers')
+    parser.add_argument('-t', dest='statistics_enabled', action='store_true',
+                        help='Let the router collect statistics during the run')
+    parser.add_argument('-x', dest='high_water_mark', default='0', help='Router high water mark. 0 = unlimited')
+    args = parser.parse_args()
+
+    print('{0} publishers x {1} messages, {2} subscribers'.format(args.publishers, args.messages, args.subscribers))
+    rate, delivered = run(int(args.publishers), int(args.subscribers), int(args.messages),
+                          int(args.high_water_mark), args.statistics_enabled)
+    print('{0:.0f} messages/sec delivered  {1:.1%} delivered'.format(rate, delivered))
+
+
+if __name__ == '__main__':
+    router_benchmark()
@@ -19,17 +19,147 @@ You should have received a copy of the GNU Lesser General Public
 License along with this library; if not, write to the Free Software
 Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
 """
-import os
+import argparse
+import collections
 import signal
 import socket
 import sys
+import threading
 import time
 
+import umsgpack
 import zmq
 
 # from xideco.data_files.port_map import port_map
 
 
+class RouterStatistics(threading.Thread):
+    """
+    This thread counts the messages passing through the router, using the router's capture socket,
+    and answers statistics requests on the statistics socket.
+    The capture socket is a PUB socket with a small high water mark. If this thread falls behind,
+    copies of messages are dropped instead of holding up the router, and the counts are then low.
+    """
+
+    # captured messages received before the statistics socket is checked again
+    CAPTURE_BATCH = 1000
+
+    # rates are calculated over the messages received in the last RATE_WINDOW seconds,
+    # counted in buckets of RATE_BUCKET seconds
+    RATE_WINDOW = 1.0
+    RATE_BUCKET = 0.1
+
+    def __init__(self, capture, statistics):
+        """
+        :param capture: SUB socket receiving a copy of every message forwarded by the router
+        :param statistics: REP socket for statistics requests
+        """
+        super().__init__(daemon=True)
+        self.capture = capture
+        self.statistics = statistics
+
+        # per topic totals: [messages, bytes]
+        self.totals = {}
+
+        # recent per topic counts, oldest first: [bucket number, {topic: [messages, bytes]}]
+        # bucket number n holds the messages received from n * RATE_BUCKET to (n + 1) * RATE_BUCKET seconds
+        self.buckets = collections.deque()
+
+    def run(self):
+        poller = zmq.Poller()
+        poller.register(self.capture, zmq.POLLIN)
+        poller.register(self.statistics, zmq.POLLIN)
+
+        try:
+            while True:
+                events = dict(poller.poll(1000))
+
+                if self.capture in events:
+                    self.drain_capture()
+
+                if self.statistics in events:
+                    self.statistics.recv()
+                    self.statistics.send(umsgpack.packb(self.report()))
+        except zmq.error.ContextTerminated:
+            # the sockets must be closed before the router's context can finish terminating
+            self.capture.close(linger=0)
+            self.statistics.close(linger=0)
+
+    def drain_capture(self):
+        """
+        Count the captured messages waiting on the capture socket, up to CAPTURE_BATCH of them
+        :return:
+        """
+        now = time.time()
+        for _ in range(self.CAPTURE_BATCH):
+            try:
+                frames = self.capture.recv_multipart(zmq.NOBLOCK)
+            except zmq.error.Again:
+                return
+            self.count(frames, now)
+
+    def count(self, frames, now):
+        """
+        Add a captured message to the topic totals. Subscription messages are single frames and are not counted.
+        :param frames: message frames
+        :param now: time the message was received
+        :return:
+        """
+        if len(frames) < 2:
+            return
+        topic = frames[0].decode(errors='replace')
+        size = sum(len(frame) for frame in frames)
+
+        bucket = int(now / self.RATE_BUCKET)
+        if not self.buckets or self.buckets[-1][0] != bucket:
+            self.buckets.append([bucket, {}])
+            self.expire_buckets(now)
+
+        for counters in (self.totals, self.buckets[-1][1]):
+            topic_counters = counters.setdefault(topic, [0, 0])
+            topic_counters[0] += 1
+            topic_counters[1] += size
+
+    def expire_buckets(self, now):
+        """
+        Discard the buckets that are older than the rate window
+        :param now: current time
+        :return:
+        """
+        while self.buckets and (self.buckets[0][0] + 1) * self.RATE_BUCKET <= now - self.RATE_WINDOW:
+            self.buckets.popleft()
+
+    def rates(self):
+        """
+        :return: per topic [messages/sec, bytes/sec] over the last RATE_WINDOW seconds
+        """
+        now = time.time()
+        self.expire_buckets(now)
+        if not self.buckets:
+            return {}
+
+        # the oldest bucket may have started up to one bucket before the window
+        elapsed = max(self.RATE_WINDOW, now - self.buckets[0][0] * self.RATE_BUCKET)
+
+        rates = {}
+        for _, bucket in self.buckets:
+            for topic, (messages, size) in bucket.items():
+                topic_rates = rates.setdefault(topic, [0, 0])
+                topic_rates[0] += messages / elapsed
+                topic_rates[1] += size / elapsed
+        return rates
+
+    def report(self):
+        """
+        :return: dictionary of topic statistics
+        """
+        rates = self.rates()
+        return {topic: {'messages': messages, 'bytes': size,
+                        'messages_per_sec': rates.get(topic, [0, 0])[0],
+                        'bytes_per_sec': rates.get(topic, [0, 0])[1]}
+                for topic, (messages, size) in self.totals.items()}
+
+
 # noinspection PyUnresolvedReferences,PyUnresolvedReferences,PyUnresolvedReferences,PyUnresolvedReferences,PyUnresolvedReferences
 class XidecoRouter:
     """
@@ -38,81 +168,297 @@ class XidecoRouter:
     for board data changes.
     """
 
-    def __init__(self):
+    def __init__(self, high_water_mark=10000, keepalive=True, statistics_port='43126', statistics_enabled=True,
+                 local_endpoints=None, context=None, bind_addresses=None, linger=1000, capture_high_water_mark=1000):
         """
         This is the constructor for the XidecoRouter class.
         :param: use_port_map: If true, use the ip address in the port map, if false, use discovered ip address
+        :param high_water_mark: SNDHWM and RCVHWM for the router sockets - messages queued per connection
+        :param keepalive: Enable TCP keepalive so that connections to vanished clients are detected
+        :param statistics_port: port for statistics requests
+        :param statistics_enabled: Count messages per topic. This copies every message to the statistics thread.
+        :param local_endpoints: Optional (publish to router, subscribe to router) pair of ipc:// or inproc://
+                                endpoints to bind in addition to the TCP ports, for clients on the same computer.
+        :param context: zmq context to use. Clients using inproc:// endpoints must share the router's context.
+        :param bind_addresses: List of IP addresses of the interfaces to bind the TCP ports to. '*' binds all
+                               interfaces. If not specified, the address used to reach the internet is discovered.
+        :param linger: milliseconds that unsent messages are kept when the router shuts down
+        :param capture_high_water_mark: message copies queued for the statistics thread before copies are dropped
         :return: None
         """
-        # figure out the IP address of the router
-        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        # use the google dns
-        s.connect(('8.8.8.8', 0))
-        self.ip_addr = s.getsockname()[0]
+        if bind_addresses:
+            self.bind_addresses = bind_addresses
+        else:
+            self.bind_addresses = [self.discover_ip_address()]
+        self.ip_addr = self.bind_addresses[0]
 
         # identify the router ip address for the user on the console
         print('\nXiBot Router - xibrt')
 
         print('\n******************************************')
-        print('Using router IP address = ' + self.ip_addr)
+        print('Using router IP address = ' + ', '.join(self.bind_addresses))
         print()
         print('Publish  to router port:          43124')
         print('Subscrbe to router port:          43125')
+        if statistics_enabled:
+            print('Statistics port:                  ' + statistics_port)
+        if local_endpoints:
+            print('Publish  to router endpoint:      ' + local_endpoints[0])
+            print('Subscrbe to router endpoint:      ' + local_endpoints[1])
         print('******************************************')
 
-        self.router = zmq.Context()
-        # establish router as a ZMQ FORWARDER Device
+        self.linger = linger
+
+        # a context passed in belongs to the caller and is not terminated by clean_up
+        self.own_context = context is None
+        if context:
+            self.router = context
+        else:
+            self.router = zmq.Context()
+        # establish router as a ZMQ proxy
 
         # subscribe to any message that any entity publishes
-        self.publish_to_router = self.router.socket(zmq.SUB)
-        bind_string = 'tcp://' + self.ip_addr + ':43124'
-        self.publish_to_router.bind(bind_string)
-        # Don't filter any incoming messages, just pass them through
-        self.publish_to_router.setsockopt_string(zmq.SUBSCRIBE, '')
+        # XSUB passes subscriptions on to the publishers, so unwanted topics are filtered at the source
+        self.publish_to_router = self.router.socket(zmq.XSUB)
+        self.configure_socket(self.publish_to_router, high_water_mark, keepalive)
+        for address in self.bind_addresses:
+            self.publish_to_router.bind('tcp://' + address + ':43124')
+        if local_endpoints:
+            self.publish_to_router.bind(local_endpoints[0])
 
         # publish these messages
-        self.subscribe_to_router = self.router.socket(zmq.PUB)
-        bind_string = 'tcp://' + self.ip_addr + ':43125'
-        self.subscribe_to_router.bind(bind_string)
+        self.subscribe_to_router = self.router.socket(zmq.XPUB)
+        self.configure_socket(self.subscribe_to_router, high_water_mark, keepalive)
+        for address in self.bind_addresses:
+            self.subscribe_to_router.bind('tcp://' + address + ':43125')
+        if local_endpoints:
+            self.subscribe_to_router.bind(local_endpoints[1])
+
+        # every forwarded message is copied to the capture socket for the statistics thread.
+        # A PUB socket drops copies when its queue is full, so the statistics thread can never slow the router.
+        self.capture = None
+        self.statistics = None
+        if statistics_enabled:
+            self.capture = self.router.socket(zmq.PUB)
+            self.capture.setsockopt(zmq.SNDHWM, capture_high_water_mark)
+            self.capture.bind('inproc://xibrt-capture')
+            capture_receiver = self.router.socket(zmq.SUB)
+            capture_receiver.setsockopt(zmq.RCVHWM, capture_high_water_mark)
+            capture_receiver.connect('inproc://xibrt-capture')
+            capture_receiver.setsockopt(zmq.SUBSCRIBE, b'')
+
+            statistics = self.router.socket(zmq.REP)
+            for address in self.bind_addresses:
+                statistics.bind('tcp://' + address + ':' + statistics_port)
 
-        zmq.device(zmq.FORWARDER, self.publish_to_router, self.subscribe_to_router)
+            self.statistics = RouterStatistics(capture_receiver, statistics)
+            self.statistics.start()
+
+        # the proxy accepts PAUSE, RESUME and TERMINATE commands on the control socket
+        self.control = self.router.socket(zmq.PAIR)
+        self.control.bind('inproc://xibrt-control')
+        self.controller = self.router.socket(zmq.PAIR)
+        self.controller.connect('inproc://xibrt-control')
+
+        self.start_time = None
+        self.stop_time = None
+
+        # proxy counters read when the router is stopped:
+        # [frames, bytes] received from publishers and [frames, bytes] sent to subscribers
+        self.forwarded = None
 
     # noinspection PyMethodMayBeStatic
+    def discover_ip_address(self):
+        """
+        Find the address of the interface used to reach the internet. No packets are sent.
+        If there is no route, for example on an isolated network, all interfaces are used.
+        :return: IP address or '*'
+        """
+        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            # use the google dns
+            s.connect(('8.8.8.8', 0))
+            return s.getsockname()[0]
+        except OSError:
+            return '*'
+        finally:
+            s.close()
+
+    # noinspection PyMethodMayBeStatic
+    def configure_socket(self, router_socket, high_water_mark, keepalive):
+        """
+        Set the high water marks and keepalive for a router socket
+        :param router_socket: socket to configure
+        :param high_water_mark: SNDHWM and RCVHWM value
+        :param keepalive: Enable TCP keepalive
+        :return:
+        """
+        router_socket.setsockopt(zmq.SNDHWM, high_water_mark)
+        router_socket.setsockopt(zmq.RCVHWM, high_water_mark)
+        if keepalive:
+            router_socket.setsockopt(zmq.TCP_KEEPALIVE, 1)
+            router_socket.setsockopt(zmq.TCP_KEEPALIVE_IDLE, 60)
+            router_socket.setsockopt(zmq.TCP_KEEPALIVE_INTVL, 10)
+
     def route(self):
         """
-        This method runs in a forever loop.
+        Forward messages until the router is stopped. The calling thread blocks inside zmq.
         :return:
         """
-        while True:
-            try:
-                time.sleep(.001)
-            except KeyboardInterrupt:
-                sys.exit(0)
+        self.start_time = time.time()
+        try:
+            zmq.proxy_steerable(self.publish_to_router, self.subscribe_to_router, self.capture, self.control)
+        except zmq.error.ContextTerminated:
+            pass
+        self.stop_time = time.time()
+
+    def stop(self):
+        """
+        Read the proxy counters and make route return. Must not be called from the thread running route.
+        :return:
+        """
+        self.controller.send(b'STATISTICS')
+        if self.controller.poll(1000):
+            counters = [int.from_bytes(frame, sys.byteorder) for frame in self.controller.recv_multipart()]
+            # frontend frames in, bytes in and backend frames out, bytes out
+            if len(counters) == 8:
+                self.forwarded = [counters[0:2], counters[6:8]]
+        self.controller.send(b'TERMINATE')
 
     def clean_up(self):
-        self.publish_to_router.close()
-        self.subscribe_to_router.close()
-        self.router.term()
+        """
+        Close the router sockets, waiting at most linger milliseconds for unsent messages
+        :return:
+        """
+        for router_socket in (self.publish_to_router, self.subscribe_to_router, self.capture, self.control,
+                              self.controller):
+            if router_socket:
+                router_socket.close(linger=self.linger)
+
+        if self.own_context:
+            self.router.term()
+            if self.statistics:
+                self.statistics.join()
+
+    def print_summary(self):
+        """
+        Print the uptime and forwarded message counters
+        :return:
+        """
+        uptime = (self.stop_time or time.time()) - (self.start_time or time.time())
+        hours, remainder = divmod(int(uptime), 3600)
+        minutes, seconds = divmod(remainder, 60)
+        print('Uptime:             {0}:{1:02}:{2:02}'.format(hours, minutes, seconds))
+
+        if self.statistics:
+            totals = self.statistics.totals.values()
+            print('Messages forwarded: {0} ({1} bytes)'.format(sum(counters[0] for counters in totals),
+                                                               sum(counters[1] for counters in totals)))
+
+        # zmq counts each part of a multipart message
+        if self.forwarded:
+            (received, received_bytes), (sent, sent_bytes) = self.forwarded
+            print('Frames received:    {0} ({1} bytes)'.format(received, received_bytes))
+            print('Frames delivered:   {0} ({1} bytes)'.format(sent, sent_bytes))
+
+
+def ipc_endpoints(path):
+    """
+    Build the local endpoint pair used with the -u option
+    :param path: ipc path prefix - e.g. /tmp/xibot
+    :return: (publish to router, subscribe to router) ipc endpoints
+    """
+    return 'ipc://' + path + '-pub', 'ipc://' + path + '-sub'
+
+
+def print_statistics(router_ip_address, statistics_port):
+    """
+    Request the statistics from a running router and print them
+    :param router_ip_address: router IP address
+    :param statistics_port: router statistics port
+    :return:
+    """
+    context = zmq.Context()
+    request = context.socket(zmq.REQ)
+    request.setsockopt(zmq.LINGER, 0)
+    request.connect('tcp://' + router_ip_address + ':' + statistics_port)
+    request.send(b'STATISTICS')
+
+    if request.poll(2000):
+        statistics = umsgpack.unpackb(request.recv())
+        print('{0:<20}{1:>12}{2:>14}{3:>12}{4:>14}'.format('Topic', 'Messages', 'Bytes', 'Msgs/sec', 'Bytes/sec'))
+        for topic in sorted(statistics):
+            topic_statistics = statistics[topic]
+            print('{0:<20}{1:>12}{2:>14}{3:>12.1f}{4:>14.1f}'.format(topic, topic_statistics['messages'],
+                                                                     topic_statistics['bytes'],
+                                                                     topic_statistics['messages_per_sec'],
+                                                                     topic_statistics['bytes_per_sec']))
+    else:
+        print('No reply from the router')
+
+    request.close()
+    context.term()
 
 
 def xideco_router():
     # noinspection PyShadowingNames
 
-    xideco_router = XidecoRouter()
-    xideco_router.route()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-b', dest='bind_addresses', default='None',
+                        help='Comma separated interface IP addresses to bind to. * = all interfaces. '
+                             'If not specified, the address is discovered')
+    parser.add_argument('-k', dest='keepalive', default='1', help='TCP keepalive. 1 = enabled, 0 = disabled')
+    parser.add_argument('-m', dest='high_water_mark', default='10000',
+                        help='Send and receive high water mark - messages queued per connection')
+    parser.add_argument('-n', dest='statistics_enabled', action='store_false',
+                        help='Do not collect statistics. Every message is then handled by zmq alone')
+    parser.add_argument('-q', dest='query', default='None',
+                        help='Print the statistics of the router running at this IP address and exit')
+    parser.add_argument('-s', dest='statistics_port', default='43126', help='Statistics port')
+    parser.add_argument('-u', dest='ipc_path', default='None',
+                        help='Also bind ipc endpoints for local clients - e.g. /tmp/xibot')
+
+    args = parser.parse_args()
+
+    if args.query != 'None':
+        print_statistics(args.query, args.statistics_port)
+        return
+
+    local_endpoints = None
+    if args.ipc_path != 'None':
+        local_endpoints = ipc_endpoints(args.ipc_path)
+
+    bind_addresses = None
+    if args.bind_addresses != 'None':
+        bind_addresses = [address.strip() for address in args.bind_addresses.split(',')]
+
+    stop_signals = {signal.SIGINT, signal.SIGTERM}
+    if hasattr(signal, 'pthread_sigmask'):
+        # block the stop signals before any thread is started so that only sigwait below receives them
+        signal.pthread_sigmask(signal.SIG_BLOCK, stop_signals)
 
-    # signal handler function called when Control-C occurs
-    # noinspection PyShadowingNames,PyUnusedLocal,PyUnusedLocal
-    def signal_handler(signal, frame):
-        print('Control-C detected. See you soon.')
+    xideco_router = XidecoRouter(int(args.high_water_mark), args.keepalive != '0', args.statistics_port,
+                                 args.statistics_enabled, local_endpoints=local_endpoints,
+                                 bind_addresses=bind_addresses)
 
-        xideco_router.clean_up()
+    router = threading.Thread(target=xideco_router.route)
+    router.start()
 
-        sys.exit(0)
+    # wait for Control-C or a termination request
+    if hasattr(signal, 'sigwait'):
+        signal.sigwait(stop_signals)
+    else:
+        try:
+            while router.is_alive():
+                router.join(1)
+        except KeyboardInterrupt:
+            pass
 
-    # listen for SIGINT
-    signal.signal(signal.SIGINT, signal_handler)
-    signal.signal(signal.SIGTERM, signal_handler)
+    print('Stopping the router. See you soon.')
+    xideco_router.stop()
+    router.join()
+    xideco_router.clean_up()
+    xideco_router.print_summary()
 
 
 # Instantiate the router and start the route loop
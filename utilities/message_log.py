@@ -0,0 +1,341 @@
+"""
+Copyright (c) 2016 Alan Yorinks All rights reserved.
+
+This program is free software; you can redistribute it and/or
+modify it under the terms of the GNU  General Public
+License as published by the Free Software Foundation; either
+version 3 of the License, or (at your option) any later version.
+
+This library is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public
+License along with this library; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+import mmap
+import os
+import struct
+
+import numpy as np
+import umsgpack
+
+# A message log is a directory of numbered segments. Each segment is a data file and an index file.
+#
+# A data file starts with this marker and is followed by records, one per message:
+#     record header - receive time (seconds since the epoch) and number of frames
+#     for each frame - frame length followed by the frame bytes exactly as received from zmq
+LOG_MARKER = b'XIBOTLOG'
+RECORD_HEADER = struct.Struct('<dH')
+FRAME_LENGTH = struct.Struct('<I')
+
+# The index file has one fixed size entry per data record, in the same order:
+#     receive time, record offset and length in the data file, topic, robot_id and info_type.
+# Strings longer than their field are truncated. A query for a longer value matches its truncated form
+# in the index and then checks the full value in the record. The index can be memory mapped as a numpy array.
+INDEX_ENTRY = struct.Struct('<dQI12s8s16s')
+INDEX_DTYPE = np.dtype([('time', '<f8'), ('offset', '<u8'), ('length', '<u4'), ('topic', 'S12'),
+                        ('robot_id', 'S8'), ('info_type', 'S16')])
+
+DATA_SUFFIX = '.xlog'
+INDEX_SUFFIX = '.xidx'
+
+# a new segment is started when the data file reaches this size
+SEGMENT_SIZE = 256 * 1024 * 1024
+
+
+def peek_fixstr(payload, position):
+    """
+    Read a msgpack string of up to 31 bytes
+    :param payload: packed data
+    :param position: offset of the string
+    :return: string and the offset after it, or None and position if there is no short string at position
+    """
+    if position < len(payload) and 0xa0 <= payload[position] <= 0xbf:
+        end = position + 1 + (payload[position] & 0x1f)
+        return payload[position + 1:end].decode(errors='replace'), end
+    return None, position
+
+
+def peek_report(payload):
+    """
+    Read the robot_id and info_type of a report without unpacking the whole payload.
+    RedBotController builds every report with robot_id and info_type as its first two entries.
+    Payloads laid out differently are unpacked.
+    :param payload: packed payload
+    :return: robot_id, info_type. Either may be None.
+    """
+    fields = {}
+    if payload and 0x80 <= payload[0] <= 0x8f:
+        position = 1
+        for _ in range(2):
+            key, position = peek_fixstr(payload, position)
+            value, position = peek_fixstr(payload, position)
+            if key is None or value is None:
+                break
+            fields[key] = value
+
+    if 'robot_id' not in fields or 'info_type' not in fields:
+        try:
+            fields = umsgpack.unpackb(payload)
+            robot_id = fields.get('robot_id')
+            fields = {'robot_id': None if robot_id is None else str(robot_id), 'info_type': fields.get('info_type')}
+        except (umsgpack.UnpackException, AttributeError, TypeError, ValueError):
+            return None, None
+
+    return fields['robot_id'], fields['info_type']
+
+
+def index_keys(frames):
+    """
+    Find the robot_id and info_type of a message for its index entry.
+    Messages that are not robot reports are indexed by topic alone.
+    :param frames: message frames
+    :return: robot_id, info_type as bytes
+    """
+    if len(frames) == 2:
+        robot_id, info_type = peek_report(frames[1])
+        return (robot_id or '').encode(), str(info_type or '').encode()
+    return b'', b''
+
+
+def record_matches(frames, topic, robot_id, info_types):
+    """
+    Check the full topic, robot_id and info_type of a message, for query values longer than their index field
+    :param frames: message frames
+    :param topic: topic as bytes, or None
+    :param robot_id: robot_id as bytes, or None
+    :param info_types: list of info_types as bytes, or None
+    :return: True if the message matches
+    """
+    if topic is not None and frames[0] != topic:
+        return False
+    if robot_id is None and info_types is None:
+        return True
+
+    message_robot_id, message_info_type = index_keys(frames)
+    if robot_id is not None and message_robot_id != robot_id:
+        return False
+    return info_types is None or message_info_type in info_types
+
+
+def segment_paths(path):
+    """
+    :param path: message log directory
+    :return: sorted list of segment paths without their suffix
+    """
+    names = sorted(name[:-len(DATA_SUFFIX)] for name in os.listdir(path) if name.endswith(DATA_SUFFIX))
+    return [os.path.join(path, name) for name in names]
+
+
+class MessageLogWriter:
+    """
+    This class appends raw zmq multipart messages to a message log.
+    Frames are stored as received. The robot_id and info_type of two frame messages are read from the start
+    of the payload, to index it.
+    Each recording starts a new segment, so an existing log is never rewritten.
+    """
+
+    def __init__(self, path, segment_size=SEGMENT_SIZE, buffer_size=1024 * 1024):
+        """
+        :param path: message log directory. It is created if it does not exist.
+        :param segment_size: data file size at which a new segment is started
+        :param buffer_size: size of the write buffers
+        """
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.segment_size = segment_size
+        self.buffer_size = buffer_size
+
+        segments = segment_paths(path)
+        self.segment_number = int(os.path.basename(segments[-1])) + 1 if segments else 0
+
+        self.data = None
+        self.index = None
+        self.offset = 0
+        self.messages = 0
+        self.open_segment()
+
+    def open_segment(self):
+        """
+        Close the current segment and start the next one
+        :return:
+        """
+        if self.data:
+            self.close()
+            self.segment_number += 1
+
+        segment = os.path.join(self.path, '{0:06d}'.format(self.segment_number))
+        self.data = open(segment + DATA_SUFFIX, 'wb', buffering=self.buffer_size)
+        self.index = open(segment + INDEX_SUFFIX, 'wb', buffering=self.buffer_size)
+        self.data.write(LOG_MARKER)
+        self.offset = len(LOG_MARKER)
+
+    def write(self, timestamp, frames, keys=None):
+        """
+        Append a message
+        :param timestamp: time the message was received
+        :param frames: list of message frames
+        :param keys: (robot_id, info_type) as bytes, if already known
+        :return:
+        """
+        if self.offset >= self.segment_size:
+            self.open_segment()
+
+        record = [RECORD_HEADER.pack(timestamp, len(frames))]
+        for frame in frames:
+            record.append(FRAME_LENGTH.pack(len(frame)))
+            record.append(frame)
+        record = b''.join(record)
+        self.data.write(record)
+
+        robot_id, info_type = keys or index_keys(frames)
+        self.index.write(INDEX_ENTRY.pack(timestamp, self.offset, len(record), frames[0], robot_id, info_type))
+
+        self.offset += len(record)
+        self.messages += 1
+
+    def close(self):
+        self.data.close()
+        self.index.close()
+
+
+def parse_record(record):
+    """
+    :param record: one complete data file record
+    :return: timestamp, list of frames
+    """
+    timestamp, frame_count = RECORD_HEADER.unpack_from(record)
+    position = RECORD_HEADER.size
+    frames = []
+    for _ in range(frame_count):
+        frame_size = FRAME_LENGTH.unpack_from(record, position)[0]
+        position += FRAME_LENGTH.size
+        frames.append(bytes(record[position:position + frame_size]))
+        position += frame_size
+    return timestamp, frames
+
+
+def read_data_file(path):
+    """
+    Read the messages of one data file in the order they were written.
+    A record cut short, for example by a recorder that was killed, ends the file.
+    :param path: data file path
+    :return: generator of (timestamp, list of frames)
+    """
+    with open(path, 'rb') as log:
+        if log.read(len(LOG_MARKER)) != LOG_MARKER:
+            raise ValueError(path + ' is not a message log')
+
+        while True:
+            header = log.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                return
+            timestamp, frame_count = RECORD_HEADER.unpack(header)
+
+            frames = []
+            for _ in range(frame_count):
+                length = log.read(FRAME_LENGTH.size)
+                if len(length) < FRAME_LENGTH.size:
+                    return
+                frame_size = FRAME_LENGTH.unpack(length)[0]
+                frame = log.read(frame_size)
+                if len(frame) < frame_size:
+                    return
+                frames.append(frame)
+
+            yield timestamp, frames
+
+
+def read_message_log(path):
+    """
+    Read every message of a message log in the order they were written
+    :param path: message log directory, or a single data file
+    :return: generator of (timestamp, list of frames)
+    """
+    if not os.path.isdir(path):
+        yield from read_data_file(path)
+        return
+
+    for segment in segment_paths(path):
+        yield from read_data_file(segment + DATA_SUFFIX)
+
+
+def load_index(segment):
+    """
+    Memory map the index of a segment. A partly written last entry is ignored.
+    :param segment: segment path without its suffix
+    :return: numpy array of INDEX_DTYPE entries
+    """
+    entries = os.path.getsize(segment + INDEX_SUFFIX) // INDEX_DTYPE.itemsize
+    if not entries:
+        return np.zeros(0, dtype=INDEX_DTYPE)
+    return np.memmap(segment + INDEX_SUFFIX, dtype=INDEX_DTYPE, mode='r', shape=(entries,))
+
+
+def query_message_log(path, start_time=None, end_time=None, topic=None, robot_id=None, info_type=None):
+    """
+    Find the messages of a message log that match all of the given conditions, using the segment indexes.
+    Only the matching records are read from the data files.
+    Entries are assumed to be in time order, which holds unless the recording computer's clock was set back.
+    :param path: message log directory
+    :param start_time: earliest receive time (seconds since the epoch)
+    :param end_time: latest receive time (seconds since the epoch)
+    :param topic: message topic
+    :param robot_id: robot_id of the report
+    :param info_type: info_type of the report, or a tuple of info_types to match any of
+    :return: generator of (timestamp, list of frames)
+    """
+    if isinstance(info_type, str):
+        info_type = (info_type,)
+
+    topic = None if topic is None else topic.encode()
+    robot_id = None if robot_id is None else str(robot_id).encode()
+    info_type = None if info_type is None else [name.encode() for name in info_type]
+
+    # the index holds values cut to the width of their field - longer values are checked in the records
+    topic_width = INDEX_DTYPE['topic'].itemsize
+    robot_id_width = INDEX_DTYPE['robot_id'].itemsize
+    info_type_width = INDEX_DTYPE['info_type'].itemsize
+    check_records = (topic is not None and len(topic) > topic_width) or \
+                    (robot_id is not None and len(robot_id) > robot_id_width) or \
+                    (info_type is not None and any(len(name) > info_type_width for name in info_type))
+
+    for segment in segment_paths(path):
+        index = load_index(segment)
+        if not len(index) or not os.path.getsize(segment + DATA_SUFFIX):
+            continue
+
+        first = 0 if start_time is None else int(np.searchsorted(index['time'], start_time, 'left'))
+        last = len(index) if end_time is None else int(np.searchsorted(index['time'], end_time, 'right'))
+        if first >= last:
+            continue
+
+        selected = index[first:last]
+        matches = np.ones(len(selected), dtype=bool)
+        if topic is not None:
+            matches &= selected['topic'] == topic[:topic_width]
+        if robot_id is not None:
+            matches &= selected['robot_id'] == robot_id[:robot_id_width]
+        if info_type is not None:
+            matches &= np.isin(selected['info_type'], [name[:info_type_width] for name in info_type])
+        selected = selected[matches]
+        if not len(selected):
+            continue
+
+        with open(segment + DATA_SUFFIX, 'rb') as data_file:
+            data = mmap.mmap(data_file.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                for offset, length in zip(selected['offset'].tolist(), selected['length'].tolist()):
+                    # the index may be ahead of the data if the recorder was killed
+                    if offset + length > len(data):
+                        break
+                    timestamp, frames = parse_record(data[offset:offset + length])
+                    if check_records and not record_matches(frames, topic, robot_id, info_type):
+                        continue
+                    yield timestamp, frames
+            finally:
+                data.close()
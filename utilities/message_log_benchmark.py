@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+
+"""
+Copyright (c) 2016 Alan Yorinks All right reserved.
+
+This program is free software; you can redistribute it and/or
+modify it under the terms of the GNU General Public
+License as published by the Free Software Foundation; either
+version 3 of the License, or (at your option) any later version.
+
+This library is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public
+License along with this library; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import umsgpack
+
+# noinspection PyUnresolvedReferences
+from message_log import MessageLogWriter, query_message_log, read_message_log
+
+# messages are 1 ms apart, as from several robots reporting at a high rate
+MESSAGE_SPACING = .001
+
+
+def report_payloads(robots):
+    """
+    Build one packed report of each kind for each robot
+    :param robots: number of robots
+    :return: list of (packed payload, (robot_id, info_type))
+    """
+    payloads = []
+    for robot in range(1, robots + 1):
+        robot_id = str(robot)
+        reports = [{'robot_id': robot_id, 'info_type': 'encoders', 'left': 12, 'right': -3},
+                   {'robot_id': robot_id, 'info_type': 'accel_xyz', 'raw': [12, -340, 1024], 'scale': 2},
+                   {'robot_id': robot_id, 'info_type': 'ir1', 'data': 512},
+                   {'robot_id': robot_id, 'info_type': 'telemetry',
+                    'readings': [{'robot_id': robot_id, 'info_type': 'ir2', 'data': 300},
+                                 {'robot_id': robot_id, 'info_type': 'encoders', 'left': 40, 'right': 38}]}]
+        for report in reports:
+            payloads.append((umsgpack.packb(report), (robot_id.encode(), report['info_type'].encode())))
+    return payloads
+
+
+def generate(path, size, robots):
+    """
+    Write a message log of synthetic robot reports
+    :param path: message log directory
+    :param size: approximate size of the log in bytes
+    :param robots: number of robots
+    :return: first and last message time
+    """
+    payloads = report_payloads(robots)
+    writer = MessageLogWriter(path)
+    start_time = time.time()
+
+    message = 0
+    while writer.messages == 0 or (writer.segment_number * writer.segment_size + writer.offset) < size:
+        payload, keys = payloads[message % len(payloads)]
+        writer.write(start_time + message * MESSAGE_SPACING, [b'reporter', payload], keys)
+        message += 1
+    writer.close()
+
+    return start_time, start_time + (message - 1) * MESSAGE_SPACING
+
+
+def scan(path, start_time, end_time, robot_id, info_type):
+    """
+    Find the matching messages by reading and decoding the whole log, for comparison
+    :return: number of matches
+    """
+    matches = 0
+    for timestamp, frames in read_message_log(path):
+        if start_time <= timestamp <= end_time:
+            payload = umsgpack.unpackb(frames[1])
+            if payload['robot_id'] == robot_id and payload['info_type'] == info_type:
+                matches += 1
+    return matches
+
+
+def message_log_benchmark():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-d', dest='path', default='None',
+                        help='Message log directory to create. It must not exist. '
+                             'If not specified, a temporary directory is used')
+    parser.add_argument('-g', dest='size', default='2', help='Size of the message data in GB')
+    parser.add_argument('-k', dest='keep', action='store_true', help='Keep the log after the benchmark')
+    parser.add_argument('-r', dest='robots', default='4', help='Number of robots')
+    parser.add_argument('-w', dest='window', default='10', help='Seconds of traffic to query')
+    args = parser.parse_args()
+
+    # only a directory created here is ever removed, so an existing recording cannot be lost
+    if args.path == 'None':
+        args.path = tempfile.mkdtemp(prefix='xibot_log_benchmark')
+    elif os.path.exists(args.path):
+        parser.error(args.path + ' already exists')
+
+    generate_time = time.time()
+    first, last = generate(args.path, float(args.size) * 1024 * 1024 * 1024, int(args.robots))
+    generate_time = time.time() - generate_time
+    size = sum(os.path.getsize(os.path.join(args.path, name)) for name in os.listdir(args.path))
+    print('Wrote {0:.2f} GB in {1:.1f} seconds - {2:.0f} seconds of traffic'.format(
+        size / 1024 ** 3, generate_time, last - first))
+
+    # robot 3's encoder reports in a window in the middle of the log
+    start_time = first + (last - first) / 2
+    end_time = start_time + float(args.window)
+    robot_id = str(min(3, int(args.robots)))
+
+    query_time = time.time()
+    matches = sum(1 for _ in query_message_log(args.path, start_time, end_time, robot_id=robot_id,
+                                               info_type='encoders'))
+    query_time = time.time() - query_time
+    print('Indexed query: {0} matches in {1:.3f} seconds'.format(matches, query_time))
+
+    scan_time = time.time()
+    scan_matches = scan(args.path, start_time, end_time, robot_id, 'encoders')
+    scan_time = time.time() - scan_time
+    print('Full scan:     {0} matches in {1:.3f} seconds'.format(scan_matches, scan_time))
+    print('Speedup: {0:.0f}x'.format(scan_time / max(query_time, 1e-6)))
+
+    if args.keep:
+        print('Log kept in ' + args.path)
+    else:
+        shutil.rmtree(args.path)
+
+
+if __name__ == '__main__':
+    message_log_benchmark()
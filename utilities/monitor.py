@@ -20,25 +20,222 @@ You should have received a copy of the GNU Lesser General Public
 License along with this library; if not, write to the Free Software
 Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
 """
+import os
 import sys
 import signal
 import argparse
+import math
+import time
 
-from xideco.xidekit.xidekit import XideKit
+import umsgpack
+import zmq
 
+# noinspection PyUnresolvedReferences
+from message_log import MessageLogWriter, peek_report
 
-class MyMonitor(XideKit):
-    def __init__(self, router_ip_address=None, subscriber_port='43125', publisher_port='43124'):
+try:
+    # noinspection PyUnresolvedReferences
+    from router.local_endpoints import LocalXideKit
+    # noinspection PyUnresolvedReferences
+    from router.xibrt import ipc_endpoints
+except ImportError:
+    # run as a script - the package root is not on the module path
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+    # noinspection PyUnresolvedReferences
+    from router.local_endpoints import LocalXideKit
+    # noinspection PyUnresolvedReferences
+    from router.xibrt import ipc_endpoints
+
+# messages queued for the monitor before the router starts dropping them
+MONITOR_HIGH_WATER_MARK = 100000
+
+# messages handled between checks of the statistics report time
+STATISTICS_BATCH = 1000
+
+
+class MyMonitor(LocalXideKit):
+    def __init__(self, router_ip_address=None, subscriber_port='43125', publisher_port='43124',
+                 router_endpoints=None, context=None, record_file=None, info_types=None, sample_ratio=1,
+                 statistics=False):
         """
         This method monitors all messages going through a Xideco router.
         :param router_ip_address: Xideco Router IP Address - if not specified, it will be set to the local computer
         :param subscriber_port: Xideco router subscriber port. This must match that of the Xideco router
         :param publisher_port: Xideco router publisher port. This must match that of the Xideco router
+        :param router_endpoints: Optional (publish to router, subscribe to router) ipc:// or inproc:// endpoints
+                                 used instead of TCP
+        :param context: zmq context to use. Required for inproc:// endpoints - it must be the router's context.
+        :param record_file: If specified, messages are recorded in this message log directory instead of being printed
+        :param info_types: If specified, only reports with one of these info_types are printed or counted.
+                           The matching readings of telemetry messages are printed or counted as reports.
+        :param sample_ratio: Print one of every sample_ratio messages
+        :param statistics: Instead of printing messages, print message statistics once a second
         :return:
         """
         print('\nXiBot Monitor - monitor')
 
-        super().__init__(router_ip_address, subscriber_port, publisher_port)
+        self.info_types = set(info_types) if info_types else None
+        self.sample_ratio = sample_ratio
+        self.statistics = statistics
+        self.matched = 0
+
+        # per (topic, robot_id, info_type) statistics for the current one second window:
+        # [messages, bytes, last arrival time, sum of intervals, sum of squared intervals, number of intervals]
+        self.window = {}
+        self.window_start = time.time()
+
+        self.message_log = None
+        if record_file:
+            self.message_log = MessageLogWriter(record_file)
+            print('Recording to ' + record_file)
+
+        super().__init__(router_ip_address, subscriber_port, publisher_port, router_endpoints, context,
+                         subscriber_options={zmq.RCVHWM: MONITOR_HIGH_WATER_MARK})
+
+    def receive_loop(self):
+        """
+        In record mode, wait for each message and write its frames, as received, to the log.
+        In statistics mode, count the messages and print the statistics once a second.
+        Otherwise wait for each message and print the ones selected by the filters and the sample ratio.
+        :return:
+        """
+        if self.message_log:
+            self.record_loop()
+        elif self.statistics:
+            self.statistics_loop()
+        else:
+            self.print_loop()
+
+    def record_loop(self):
+        """
+        Write every message to the message log until Control-C
+        :return:
+        """
+        try:
+            while True:
+                frames = self.subscriber.recv_multipart()
+                self.message_log.write(time.time(), frames)
+        except KeyboardInterrupt:
+            self.message_log.close()
+            print('{0} messages recorded'.format(self.message_log.messages))
+            self.clean_up()
+
+    def print_loop(self):
+        """
+        Print the selected reports until Control-C. Only printed messages and telemetry messages
+        that are searched for selected readings are unpacked.
+        :return:
+        """
+        try:
+            while True:
+                frames = self.subscriber.recv_multipart()
+                for _, _, reading in self.selected_reports(frames):
+                    self.matched += 1
+                    if self.matched % self.sample_ratio == 0:
+                        if reading is None:
+                            reading = umsgpack.unpackb(frames[1]) if len(frames) > 1 else None
+                        self.incoming_message_processing(frames[0].decode(), reading)
+        except KeyboardInterrupt:
+            self.clean_up()
+
+    def statistics_loop(self):
+        """
+        Count the selected messages and print the statistics once a second until Control-C
+        :return:
+        """
+        try:
+            while True:
+                timeout = max(self.window_start + 1 - time.time(), 0)
+                if self.subscriber.poll(timeout * 1000):
+                    # read what is waiting, but not for so long that the report is late
+                    for _ in range(STATISTICS_BATCH):
+                        try:
+                            frames = self.subscriber.recv_multipart(zmq.NOBLOCK)
+                        except zmq.error.Again:
+                            break
+                        self.count(frames, time.time())
+
+                if time.time() >= self.window_start + 1:
+                    self.report_statistics()
+        except KeyboardInterrupt:
+            self.clean_up()
+
+    def selected_reports(self, frames):
+        """
+        Find the reports of a message that pass the info_type filter.
+        A message that passes is one report. For a telemetry message that does not, the readings it carries
+        are checked instead, and those that pass are its reports.
+        :param frames: message frames
+        :return: list of (robot_id, info_type, reading). reading is None when the whole message is the report.
+        """
+        if len(frames) < 2:
+            return [] if self.info_types else [(None, None, None)]
+
+        robot_id, info_type = peek_report(frames[1])
+        if not self.info_types or info_type in self.info_types:
+            return [(robot_id, info_type, None)]
+
+        if info_type == 'telemetry':
+            return [(robot_id, reading.get('info_type'), reading)
+                    for reading in umsgpack.unpackb(frames[1]).get('readings', [])
+                    if reading.get('info_type') in self.info_types]
+        return []
+
+    def count(self, frames, arrival_time):
+        """
+        Add the selected reports of a message to the statistics window.
+        Readings selected from a telemetry message share its size equally.
+        :param frames: message frames
+        :param arrival_time: time the message was received
+        :return:
+        """
+        reports = self.selected_reports(frames)
+        if not reports:
+            return
+
+        topic = frames[0].decode(errors='replace')
+        size = sum(len(frame) for frame in frames) / len(reports)
+
+        for robot_id, info_type, _ in reports:
+            key = (topic, robot_id or '-', info_type or '-')
+            counters = self.window.get(key)
+            if counters is None:
+                counters = self.window[key] = [0, 0, None, 0.0, 0.0, 0]
+
+            counters[0] += 1
+            counters[1] += size
+            if counters[2] is not None:
+                interval = arrival_time - counters[2]
+                counters[3] += interval
+                counters[4] += interval * interval
+                counters[5] += 1
+            counters[2] = arrival_time
+
+    def report_statistics(self):
+        """
+        Print the statistics of the window that just ended and start a new window.
+        Jitter is the standard deviation of the time between messages.
+        :return:
+        """
+        now = time.time()
+        elapsed = now - self.window_start
+
+        print()
+        print('{0:<12}{1:>8}  {2:<18}{3:>12}{4:>12}{5:>14}{6:>12}'.format('Topic', 'Robot', 'Info type', 'Msgs/sec',
+                                                                          'Avg bytes', 'Interval ms', 'Jitter ms'))
+        for (topic, robot_id, info_type), (messages, size, _, intervals, squares, n) in sorted(self.window.items()):
+            # a robot that has gone quiet is kept for one window so that its next interval is measured
+            if not messages:
+                continue
+            mean = intervals / n if n else 0
+            jitter = math.sqrt(max(squares / n - mean * mean, 0)) if n else 0
+            print('{0:<12}{1:>8}  {2:<18}{3:>12.1f}{4:>12.1f}{5:>14.2f}{6:>12.2f}'.format(
+                topic, robot_id, info_type, messages / elapsed, size / messages, mean * 1000, jitter * 1000))
+
+        # keep the last arrival times so that the first interval of the next window is measured
+        self.window = {key: [0, 0, counters[2], 0.0, 0.0, 0] for key, counters in self.window.items()
+                       if counters[0]}
+        self.window_start = now
 
     def incoming_message_processing(self, topic, payload):
         """
@@ -59,7 +256,18 @@ def start_monitor():
 
     parser = argparse.ArgumentParser()
 
+    parser.add_argument('-i', dest='info_types', default='None',
+                        help='Comma separated info_types of the reports to print or count - e.g. encoders,ir1')
+    parser.add_argument('-n', dest='sample_ratio', default='1', help='Print one of every n messages')
+    parser.add_argument('-o', dest='record_file', default='None',
+                        help='Record the raw messages in this message log directory instead of printing them')
     parser.add_argument('-r', dest='router_ip_address', default='None', help='Router IP Address')
+    parser.add_argument('-s', dest='statistics', action='store_true',
+                        help='Print per topic and robot message statistics once a second instead of the messages')
+    parser.add_argument('-t', dest='topics', default='',
+                        help='Comma separated topics to subscribe to - e.g. reporter. Default is all topics')
+    parser.add_argument('-u', dest='ipc_path', default='None',
+                        help='Use the router ipc endpoints with this path prefix instead of TCP - e.g. /tmp/xibot')
 
     args = parser.parse_args()
     kw_options = {}
@@ -67,8 +275,26 @@ def start_monitor():
     if args.router_ip_address != "None":
         kw_options['router_ip_address'] = args.router_ip_address
 
+    if args.record_file != 'None':
+        kw_options['record_file'] = args.record_file
+
+    if args.info_types != 'None':
+        kw_options['info_types'] = [info_type.strip() for info_type in args.info_types.split(',')]
+
+    kw_options['sample_ratio'] = int(args.sample_ratio)
+    if kw_options['sample_ratio'] < 1:
+        parser.error('-n must be 1 or more')
+    kw_options['statistics'] = args.statistics
+
+    if args.ipc_path != 'None':
+        kw_options['router_endpoints'] = ipc_endpoints(args.ipc_path)
+
     my_mon = MyMonitor(**kw_options)
-    my_mon.set_subscriber_topic('')
+    for topic in args.topics.split(','):
+        my_mon.set_subscriber_topic(topic.strip())
+
+    # a terminated recorder still writes out the messages it has buffered
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
     my_mon.receive_loop()
 
     # signal handler function called when Control-C occurs
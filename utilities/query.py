@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+
+"""
+Copyright (c) 2016 Alan Yorinks All right reserved.
+
+This program is free software; you can redistribute it and/or
+modify it under the terms of the GNU General Public
+License as published by the Free Software Foundation; either
+version 3 of the License, or (at your option) any later version.
+
+This library is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public
+License along with this library; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+import sys
+import argparse
+
+import umsgpack
+
+# noinspection PyUnresolvedReferences
+from message_log import load_index, query_message_log, segment_paths
+
+
+def log_start_time(path):
+    """
+    :param path: message log directory
+    :return: receive time of the first message in the log, or None for an empty log
+    """
+    for segment in segment_paths(path):
+        index = load_index(segment)
+        if len(index):
+            return float(index['time'][0])
+    return None
+
+
+def query(path, start=None, end=None, topic=None, robot_id=None, info_type=None):
+    """
+    Find the matching messages of a message log.
+    Reports held back by the robot controller for a telemetry message are matched inside that message.
+    :param path: message log directory
+    :param start: start of the time range, in seconds from the start of the log
+    :param end: end of the time range, in seconds from the start of the log
+    :param topic: message topic
+    :param robot_id: robot_id of the report
+    :param info_type: info_type of the report
+    :return: generator of (seconds from the start of the log, topic, payload)
+    """
+    log_start = log_start_time(path)
+    if log_start is None:
+        return
+
+    start_time = None if start is None else log_start + start
+    end_time = None if end is None else log_start + end
+    info_types = None if info_type is None else (info_type, 'telemetry')
+
+    for timestamp, frames in query_message_log(path, start_time, end_time, topic, robot_id, info_types):
+        payload = umsgpack.unpackb(frames[1]) if len(frames) > 1 else None
+
+        if info_type is not None and info_type != 'telemetry' and payload['info_type'] == 'telemetry':
+            for reading in payload['readings']:
+                if reading['info_type'] == info_type:
+                    yield timestamp - log_start, frames[0].decode(), reading
+        else:
+            yield timestamp - log_start, frames[0].decode(), payload
+
+
+def start_query():
+    """
+    Main function for the query tool
+    :return:
+    """
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('-b', dest='start', default='None',
+                        help='Start of the time range, in seconds from the start of the log')
+    parser.add_argument('-c', dest='count', action='store_true', help='Print the number of matches only')
+    parser.add_argument('-e', dest='end', default='None',
+                        help='End of the time range, in seconds from the start of the log')
+    parser.add_argument('-f', dest='record_file', required=True, help='Message log recorded with monitor -o')
+    parser.add_argument('-i', dest='robot_id', default='None', help='Robot ID')
+    parser.add_argument('-o', dest='topic', default='None', help='Message topic - e.g. reporter')
+    parser.add_argument('-t', dest='info_type', default='None', help='Report info_type - e.g. encoders')
+
+    args = parser.parse_args()
+    kw_options = {}
+
+    for option in ('topic', 'robot_id', 'info_type'):
+        if getattr(args, option) != 'None':
+            kw_options[option] = getattr(args, option)
+    for option in ('start', 'end'):
+        if getattr(args, option) != 'None':
+            kw_options[option] = float(getattr(args, option))
+
+    matches = 0
+    for seconds, topic, payload in query(args.record_file, **kw_options):
+        matches += 1
+        if not args.count:
+            print('{0:12.3f} {1} {2}'.format(seconds, topic, payload))
+
+    if args.count:
+        print(matches)
+
+
+if __name__ == "__main__":
+
+    try:
+        start_query()
+    except (KeyboardInterrupt, BrokenPipeError):
+        sys.exit(0)
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+
+"""
+Copyright (c) 2016 Alan Yorinks All right reserved.
+
+This program is free software; you can redistribute it and/or
+modify it under the terms of the GNU General Public
+License as published by the Free Software Foundation; either
+version 3 of the License, or (at your option) any later version.
+
+This library is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public
+License along with this library; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+import os
+import sys
+import argparse
+import time
+
+import zmq
+
+# noinspection PyUnresolvedReferences
+from message_log import read_message_log
+
+try:
+    # noinspection PyUnresolvedReferences
+    from router.local_endpoints import LocalXideKit
+    # noinspection PyUnresolvedReferences
+    from router.xibrt import ipc_endpoints
+except ImportError:
+    # run as a script - the package root is not on the module path
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+    # noinspection PyUnresolvedReferences
+    from router.local_endpoints import LocalXideKit
+    # noinspection PyUnresolvedReferences
+    from router.xibrt import ipc_endpoints
+
+
+class MyReplayer(LocalXideKit):
+    def __init__(self, router_ip_address=None, subscriber_port='43125', publisher_port='43124',
+                 router_endpoints=None):
+        """
+        This class republishes the messages of a message log recorded by the monitor.
+        :param router_ip_address: Xideco Router IP Address - if not specified, it will be set to the local computer
+        :param subscriber_port: Xideco router subscriber port. This must match that of the Xideco router
+        :param publisher_port: Xideco router publisher port. This must match that of the Xideco router
+        :param router_endpoints: Optional (publish to router, subscribe to router) ipc:// endpoints used instead of TCP
+        :return:
+        """
+        print('\nXiBot Replayer - replay')
+
+        # replay as fast as the router accepts the messages instead of dropping them
+        super().__init__(router_ip_address, subscriber_port, publisher_port, router_endpoints,
+                         publisher_options={zmq.SNDHWM: 0})
+
+    def replay(self, path, speed=1.0):
+        """
+        Publish the messages of a log with their original spacing divided by speed.
+        :param path: message log path
+        :param speed: replay speed. 1 = original speed, 2 = twice as fast, 0 = as fast as possible
+        :return: number of messages published
+        """
+        messages = 0
+        first_timestamp = None
+        start_time = time.time()
+
+        for timestamp, frames in read_message_log(path):
+            if speed:
+                if first_timestamp is None:
+                    first_timestamp = timestamp
+                delay = start_time + (timestamp - first_timestamp) / speed - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+
+            self.publisher.send_multipart(frames)
+            messages += 1
+
+        return messages
+
+
+def start_replay():
+    """
+    Main function for the replayer
+    :return:
+    """
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('-f', dest='record_file', required=True, help='Message log recorded with monitor -o')
+    parser.add_argument('-l', dest='loops', default='1', help='Number of times to replay the log')
+    parser.add_argument('-r', dest='router_ip_address', default='None', help='Router IP Address')
+    parser.add_argument('-s', dest='speed', default='1',
+                        help='Replay speed. 1 = original speed, 10 = ten times faster, 0 = as fast as possible')
+    parser.add_argument('-u', dest='ipc_path', default='None',
+                        help='Use the router ipc endpoints with this path prefix instead of TCP - e.g. /tmp/xibot')
+
+    args = parser.parse_args()
+    kw_options = {}
+
+    if args.router_ip_address != "None":
+        kw_options['router_ip_address'] = args.router_ip_address
+
+    if args.ipc_path != 'None':
+        kw_options['router_endpoints'] = ipc_endpoints(args.ipc_path)
+
+    my_replayer = MyReplayer(**kw_options)
+
+    # give the router time to pass on the subscriptions of its subscribers
+    time.sleep(1)
+
+    for _ in range(int(args.loops)):
+        start_time = time.time()
+        messages = my_replayer.replay(args.record_file, float(args.speed))
+        elapsed = time.time() - start_time
+        print('{0} messages replayed in {1:.2f} seconds - {2:.0f} messages/sec'.format(messages, elapsed,
+                                                                                       messages / max(elapsed, 1e-6)))
+
+    # wait for the queued messages to reach the router before closing the socket
+    my_replayer.publisher.close(linger=-1)
+    my_replayer.subscriber.close()
+    my_replayer.context.term()
+
+
+if __name__ == "__main__":
+
+    try:
+        start_replay()
+    except KeyboardInterrupt:
+        sys.exit(0)